@@ -1,131 +1,370 @@
 """Database operations for One Piece Stock Tracker."""
 
-import sqlite3
-from typing import List, Dict, Optional, Tuple
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+from operator import itemgetter
+from typing import List, Dict, Optional
 from datetime import datetime
 import json
 
+try:
+    # Same DB-API as sqlite3, bundling a current SQLite build
+    from pysqlite3 import dbapi2 as sqlite3
+except ImportError:  # optional, falls back to the SQLite Python was built with
+    import sqlite3
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used without it
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:  # optional, statistics are computed in Python without it
+    np = None
+
+# Percentiles reported by get_market_statistics (as 'p10', 'p25', ...)
+PERCENTILES = (10, 25, 33, 50, 66, 75, 90, 99)
+
+# Planner statistics are refreshed after this many chapters are processed
+# over one connection
+OPTIMIZE_INTERVAL = 50
+
+
+# Static schema, run by initialize_schema as a single script
+SCHEMA_SQL = """
+BEGIN IMMEDIATE;
+
+-- Chapters table
+CREATE TABLE IF NOT EXISTS chapters (
+    chapter_id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    url TEXT NOT NULL,
+    raw_description TEXT,
+    arc_name TEXT,
+    processed_timestamp TEXT,
+    processed BOOLEAN DEFAULT 0
+);
+
+-- Characters table
+CREATE TABLE IF NOT EXISTS characters (
+    character_id TEXT PRIMARY KEY,
+    canonical_name TEXT NOT NULL,
+    href TEXT NOT NULL UNIQUE,
+    first_appearance_chapter INTEGER,
+    initial_stock_value REAL,
+    FOREIGN KEY (first_appearance_chapter) REFERENCES chapters(chapter_id)
+);
+
+-- Market activity events table
+CREATE TABLE IF NOT EXISTS market_events (
+    event_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chapter_id INTEGER NOT NULL,
+    character_id TEXT NOT NULL,
+    character_href TEXT NOT NULL,
+    stock_change REAL NOT NULL,
+    confidence_score REAL NOT NULL,
+    description TEXT,
+    is_first_appearance BOOLEAN DEFAULT 0,
+    FOREIGN KEY (chapter_id) REFERENCES chapters(chapter_id),
+    FOREIGN KEY (character_id) REFERENCES characters(character_id)
+);
+
+-- Character stock history (computed/cached for performance)
+CREATE TABLE IF NOT EXISTS character_stock_history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    character_id TEXT NOT NULL,
+    chapter_id INTEGER NOT NULL,
+    cumulative_stock_value REAL NOT NULL,
+    chapter_change REAL NOT NULL,
+    market_rank INTEGER,
+    chapter_reasoning TEXT,
+    FOREIGN KEY (character_id) REFERENCES characters(character_id),
+    FOREIGN KEY (chapter_id) REFERENCES chapters(chapter_id),
+    UNIQUE(character_id, chapter_id)
+);
+
+-- Market context table
+CREATE TABLE IF NOT EXISTS market_context (
+    chapter_id INTEGER PRIMARY KEY,
+    top_ten_stocks TEXT,  -- JSON array
+    active_characters TEXT,  -- JSON array
+    arc_name TEXT,
+    average_stock_value REAL,
+    median_stock_value REAL,
+    total_characters INTEGER,
+    FOREIGN KEY (chapter_id) REFERENCES chapters(chapter_id)
+);
+
+-- Create indexes for performance
+CREATE INDEX IF NOT EXISTS idx_stock_history_chapter
+    ON character_stock_history(chapter_id);
+
+-- Composite index for the character + chapter lookups used by the stock
+-- calculations and the web interface. Recent history is read newest chapter
+-- first, so the index is kept in that order (the event ID breaks ties) and
+-- needs no sort; carrying stock_change lets the per-character sums read the
+-- index alone. Together with idx_market_events_chapter_character below it
+-- replaces the single-column character and chapter indexes of older
+-- databases, which are prefixes of the two.
+DROP INDEX IF EXISTS idx_market_events_character;
+DROP INDEX IF EXISTS idx_market_events_chapter;
+CREATE INDEX IF NOT EXISTS idx_market_events_character_change
+    ON market_events(character_id, chapter_id DESC, event_id, stock_change);
+
+-- Covers the per-chapter stock change totals (grouped by character) without
+-- touching the table rows, and every other lookup by chapter
+CREATE INDEX IF NOT EXISTS idx_market_events_chapter_character
+    ON market_events(chapter_id, character_id, stock_change);
+
+-- Chapter summaries list a chapter's events by size of move; an expression
+-- index returns them in that order without a sort
+CREATE INDEX IF NOT EXISTS idx_market_events_chapter_magnitude
+    ON market_events(chapter_id, ABS(stock_change) DESC);
+
+CREATE INDEX IF NOT EXISTS idx_characters_first_appearance
+    ON characters(first_appearance_chapter, canonical_name);
+
+-- The web interface only lists processed chapters (crawled chapters wait
+-- unprocessed until their analysis is saved); this partial index holds just
+-- those, in chapter order
+CREATE INDEX IF NOT EXISTS idx_chapters_processed
+    ON chapters(chapter_id) WHERE processed = 1;
+
+-- Covering index for latest-stock lookups: the web queries join the latest
+-- history row per character and aggregate its values without touching the
+-- table rows. Its character_id prefix (like the UNIQUE constraint's index)
+-- makes the single-column character index of older databases redundant.
+DROP INDEX IF EXISTS idx_stock_history_character;
+CREATE INDEX IF NOT EXISTS idx_stock_history_character_value
+    ON character_stock_history(character_id, chapter_id, cumulative_stock_value);
+
+COMMIT;
+"""
+
+
+def dumps(obj) -> str:
+    """Serialize a value to a JSON string, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj)
+
+
+def loads(text: str):
+    """Parse a JSON string, using orjson when available."""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def _transactional(method):
+    """Run a Database write method inside transaction() (joining an open one)."""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.transaction():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 
 class Database:
     """Handles all database operations for the stock tracker."""
     
-    def __init__(self, db_path: str = "one_piece_stocks.db"):
+    def __init__(self, db_path: str = "one_piece_stocks.db", keep_open: bool = False,
+                 read_only: bool = False):
+        """
+        Initialize the database handle.
+        
+        Args:
+            db_path: Path to the SQLite database file
+            keep_open: Reuse one connection across `with` blocks (closed by
+                       close()) instead of reconnecting for each block
+            read_only: Open `with` block connections read-only (inspection
+                       and query tools)
+        """
         self.db_path = db_path
+        self.keep_open = keep_open
         self.conn = None
+        self.read_only = read_only
+        self._chapters_since_optimize = 0
+        self._in_transaction = False
+        
+        # Market snapshots (ranked stocks and statistics) keyed by
+        # up_to_chapter. They only change when market events are saved for a
+        # chapter at or before that point, so save_market_event invalidates
+        # the affected entries. Assumes this instance is the only writer.
+        self._ranked_stocks_cache = {}
+        self._statistics_cache = {}
+        
+        # (chapter, {character_id: summed stock change}) for the latest
+        # chapter totaled, so the next chapter only adds its own events
+        self._totals_snapshot = None
+        
+        # Character rows (None for unknown IDs) by character_id. Existing
+        # rows are never updated, so only saving a character evicts it.
+        self._character_cache = {}
+        
+    def _reset_caches(self):
+        """Forget every cached snapshot and row (e.g. after a rollback)."""
+        self._ranked_stocks_cache.clear()
+        self._statistics_cache.clear()
+        self._totals_snapshot = None
+        self._character_cache.clear()
+        
+    def connect(self, read_only: bool = False):
+        """Connect to the database.
         
-    def connect(self):
-        """Connect to the database."""
-        self.conn = sqlite3.connect(self.db_path)
+        Args:
+            read_only: Tune the connection for read-only use (query
+                       worker, inspection tools)
+        """
+        # Autocommit mode: the module never opens transactions implicitly,
+        # so PRAGMAs run on their own and writes are grouped explicitly by
+        # transaction()
+        self.conn = sqlite3.connect(self.db_path, isolation_level=None)
         self.conn.row_factory = sqlite3.Row
+        self.read_only = read_only
+        self._chapters_since_optimize = 0
+        
+        if read_only:
+            self.conn.execute("PRAGMA query_only = ON")
+            self.conn.execute("PRAGMA temp_store = MEMORY")
+            self.conn.execute("PRAGMA cache_size = -20000")  # ~20MB page cache
+            self.conn.execute("PRAGMA mmap_size = 268435456")  # 256MB
+        else:
+            # WAL lets the web interface's query workers keep reading while
+            # the generator writes; the setting persists in the database file
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            # NORMAL is durable across application crashes in WAL mode and
+            # skips an fsync on every commit
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.execute("PRAGMA temp_store = MEMORY")
+            self.conn.execute("PRAGMA cache_size = -65536")  # ~64MB page cache
+            self.conn.execute("PRAGMA mmap_size = 268435456")  # 256MB
+            # Wait for a web worker's read lock instead of failing with
+            # "database is locked"
+            self.conn.execute("PRAGMA busy_timeout = 5000")
+            if self.keep_open:
+                # Gather planner statistics for tables that have never been
+                # analyzed (cheap when they already have them). Only the
+                # generator's long-lived connection maintains statistics.
+                self.conn.execute("PRAGMA optimize = 0x10002")
+            
+    def optimize(self):
+        """Refresh planner statistics that have gone stale (PRAGMA optimize)."""
+        self.conn.execute("PRAGMA optimize")
+        self._chapters_since_optimize = 0
         
     def close(self):
         """Close database connection."""
         if self.conn:
+            if self.keep_open and not self.read_only:
+                self.optimize()
             self.conn.close()
+            self.conn = None
             
     def __enter__(self):
         """Context manager entry."""
-        self.connect()
+        if self.conn is None:
+            self.connect(read_only=self.read_only)
         return self
         
     def __exit__(self, exc_type, exc_val, exc_tb):
         """Context manager exit."""
-        self.close()
-        
+        if not self.keep_open:
+            self.close()
+        elif exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+            self._reset_caches()
+            
+    @contextmanager
+    def transaction(self):
+        """Group writes into a single transaction.
+        
+        The connection is in autocommit mode, so writes outside a block
+        commit statement by statement. Bulk save methods open their own
+        block; calling them inside an outer block joins it, so the whole
+        block costs one commit (and one WAL sync) instead of one per write.
+        Rolls back if the block raises.
+        """
+        if self._in_transaction:
+            yield self
+            return
+        
+        if not self.conn.in_transaction:
+            self.conn.execute("BEGIN IMMEDIATE")
+        self._in_transaction = True
+        try:
+            yield self
+        except BaseException:
+            self.conn.rollback()
+            # Snapshots computed inside the block may include rolled back rows
+            self._reset_caches()
+            raise
+        else:
+            self.conn.commit()
+        finally:
+            self._in_transaction = False
+            
     def initialize_schema(self):
-        """Create all necessary tables."""
-        cursor = self.conn.cursor()
-        
-        # Chapters table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chapters (
-                chapter_id INTEGER PRIMARY KEY,
-                title TEXT NOT NULL,
-                url TEXT NOT NULL,
-                raw_description TEXT,
-                arc_name TEXT,
-                processed_timestamp TEXT,
-                processed BOOLEAN DEFAULT 0
-            )
-        """)
+        """Create all necessary tables.
         
-        # Characters table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS characters (
-                character_id TEXT PRIMARY KEY,
-                canonical_name TEXT NOT NULL,
-                href TEXT NOT NULL UNIQUE,
-                first_appearance_chapter INTEGER,
-                initial_stock_value REAL,
-                FOREIGN KEY (first_appearance_chapter) REFERENCES chapters(chapter_id)
-            )
-        """)
-        
-        # Market activity events table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS market_events (
-                event_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                chapter_id INTEGER NOT NULL,
-                character_id TEXT NOT NULL,
-                character_href TEXT NOT NULL,
-                stock_change REAL NOT NULL,
-                confidence_score REAL NOT NULL,
-                description TEXT,
-                is_first_appearance BOOLEAN DEFAULT 0,
-                FOREIGN KEY (chapter_id) REFERENCES chapters(chapter_id),
-                FOREIGN KEY (character_id) REFERENCES characters(character_id)
-            )
-        """)
-        
-        # Character stock history (computed/cached for performance)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS character_stock_history (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                character_id TEXT NOT NULL,
-                chapter_id INTEGER NOT NULL,
-                cumulative_stock_value REAL NOT NULL,
-                chapter_change REAL NOT NULL,
-                market_rank INTEGER,
-                chapter_reasoning TEXT,
-                FOREIGN KEY (character_id) REFERENCES characters(character_id),
-                FOREIGN KEY (chapter_id) REFERENCES chapters(chapter_id),
-                UNIQUE(character_id, chapter_id)
-            )
-        """)
-        
-        # Market context table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS market_context (
-                chapter_id INTEGER PRIMARY KEY,
-                top_ten_stocks TEXT,  -- JSON array
-                active_characters TEXT,  -- JSON array
-                arc_name TEXT,
-                average_stock_value REAL,
-                median_stock_value REAL,
-                total_characters INTEGER,
-                FOREIGN KEY (chapter_id) REFERENCES chapters(chapter_id)
-            )
-        """)
-        
-        # Create indexes for performance
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_market_events_chapter 
-            ON market_events(chapter_id)
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_market_events_character 
-            ON market_events(character_id)
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_stock_history_character 
-            ON character_stock_history(character_id)
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_stock_history_chapter 
-            ON character_stock_history(chapter_id)
-        """)
+        The static schema runs as a single script (SCHEMA_SQL, in its own
+        transaction). executescript commits any open transaction first, so
+        don't call this inside a transaction() block.
+        """
+        self.conn.executescript(SCHEMA_SQL)
         
-        self.conn.commit()
+        with self.transaction():
+            cursor = self.conn.cursor()
+            
+            # Full-text index over character names for the web search. The
+            # trigram tokenizer matches arbitrary substrings, which a B-tree
+            # index can't do for LIKE '%name%'. Triggers keep it in sync.
+            try:
+                fts_exists = cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'characters_fts'"
+                ).fetchone()
+                cursor.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS characters_fts USING fts5(
+                        canonical_name,
+                        content='characters',
+                        content_rowid='rowid',
+                        tokenize='trigram'
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TRIGGER IF NOT EXISTS characters_fts_insert
+                    AFTER INSERT ON characters BEGIN
+                        INSERT INTO characters_fts(rowid, canonical_name)
+                        VALUES (new.rowid, new.canonical_name);
+                    END
+                """)
+                cursor.execute("""
+                    CREATE TRIGGER IF NOT EXISTS characters_fts_delete
+                    AFTER DELETE ON characters BEGIN
+                        INSERT INTO characters_fts(characters_fts, rowid, canonical_name)
+                        VALUES ('delete', old.rowid, old.canonical_name);
+                    END
+                """)
+                cursor.execute("""
+                    CREATE TRIGGER IF NOT EXISTS characters_fts_update
+                    AFTER UPDATE ON characters BEGIN
+                        INSERT INTO characters_fts(characters_fts, rowid, canonical_name)
+                        VALUES ('delete', old.rowid, old.canonical_name);
+                        INSERT INTO characters_fts(rowid, canonical_name)
+                        VALUES (new.rowid, new.canonical_name);
+                    END
+                """)
+                
+                # Index characters saved before the search table existed
+                if not fts_exists:
+                    cursor.execute("INSERT INTO characters_fts(characters_fts) VALUES ('rebuild')")
+            except sqlite3.OperationalError as e:
+                # FTS5 trigram needs SQLite 3.34+; search falls back to LIKE
+                print(f"⚠️  Character search index unavailable: {e}")
         
     def save_chapter(self, chapter_id: int, title: str, url: str, 
                      raw_description: str, arc_name: str = None):
@@ -136,16 +375,14 @@ class Database:
             (chapter_id, title, url, raw_description, arc_name)
             VALUES (?, ?, ?, ?, ?)
         """, (chapter_id, title, url, raw_description, arc_name))
-        self.conn.commit()
         
-    def get_chapter(self, chapter_id: int) -> Optional[Dict]:
-        """Get chapter information."""
+    def get_chapter(self, chapter_id: int) -> Optional[sqlite3.Row]:
+        """Get chapter information (a read-only row, indexed by column name)."""
         cursor = self.conn.cursor()
         cursor.execute("""
             SELECT * FROM chapters WHERE chapter_id = ?
         """, (chapter_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        return cursor.fetchone()
         
     def mark_chapter_processed(self, chapter_id: int):
         """Mark a chapter as processed."""
@@ -155,37 +392,64 @@ class Database:
             SET processed = 1, processed_timestamp = ?
             WHERE chapter_id = ?
         """, (datetime.now().isoformat(), chapter_id))
-        self.conn.commit()
+        
+        self._chapters_since_optimize += 1
+        if self.keep_open and self._chapters_since_optimize >= OPTIMIZE_INTERVAL:
+            self.optimize()
         
     def is_chapter_processed(self, chapter_id: int) -> bool:
         """Check if a chapter has been processed."""
         cursor = self.conn.cursor()
+        cursor.row_factory = None
         cursor.execute("""
             SELECT processed FROM chapters WHERE chapter_id = ?
         """, (chapter_id,))
         row = cursor.fetchone()
-        return row['processed'] == 1 if row else False
+        return row[0] == 1 if row else False
         
     def save_character(self, character_id: str, canonical_name: str, 
                       href: str, first_appearance_chapter: int,
                       initial_stock_value: float):
         """Save a new character."""
+        self.save_characters([{
+            'character_id': character_id,
+            'canonical_name': canonical_name,
+            'href': href,
+            'first_appearance_chapter': first_appearance_chapter,
+            'initial_stock_value': initial_stock_value
+        }])
+        
+    @_transactional
+    def save_characters(self, characters: List[Dict]):
+        """Save several new characters in one batch.
+        
+        Args:
+            characters: Dicts holding the save_character arguments
+        """
         cursor = self.conn.cursor()
-        cursor.execute("""
+        cursor.executemany("""
             INSERT OR IGNORE INTO characters 
             (character_id, canonical_name, href, first_appearance_chapter, initial_stock_value)
             VALUES (?, ?, ?, ?, ?)
-        """, (character_id, canonical_name, href, first_appearance_chapter, initial_stock_value))
-        self.conn.commit()
+        """, [(c['character_id'], c['canonical_name'], c['href'],
+               c['first_appearance_chapter'], c['initial_stock_value'])
+              for c in characters])
+        for c in characters:
+            self._character_cache.pop(c['character_id'], None)
+        
+    def get_character(self, character_id: str) -> Optional[sqlite3.Row]:
+        """Get character information (a read-only row, indexed by column name)."""
+        # Rows are immutable, so cached ones are shared without copying
+        if character_id in self._character_cache:
+            return self._character_cache[character_id]
         
-    def get_character(self, character_id: str) -> Optional[Dict]:
-        """Get character information."""
         cursor = self.conn.cursor()
         cursor.execute("""
             SELECT * FROM characters WHERE character_id = ?
         """, (character_id,))
-        row = cursor.fetchone()
-        return dict(row) if row else None
+        character = cursor.fetchone()
+        self._character_cache[character_id] = character
+        return character
         
     def character_exists(self, character_id: str) -> bool:
         """Check if a character exists."""
@@ -196,148 +460,309 @@ class Database:
                          confidence_score: float, description: str,
                          is_first_appearance: bool = False):
         """Save a market event."""
+        self.save_market_events([{
+            'chapter_id': chapter_id,
+            'character_id': character_id,
+            'character_href': character_href,
+            'stock_change': stock_change,
+            'confidence_score': confidence_score,
+            'description': description,
+            'is_first_appearance': is_first_appearance
+        }])
+        
+    @_transactional
+    def save_market_events(self, events: List[Dict]):
+        """Save several market events in one batch, in list order.
+        
+        Args:
+            events: Dicts holding the save_market_event arguments
+                    (is_first_appearance may be left out)
+        """
+        if not events:
+            return
+        
         cursor = self.conn.cursor()
-        cursor.execute("""
+        cursor.executemany("""
             INSERT INTO market_events 
             (chapter_id, character_id, character_href, stock_change, 
              confidence_score, description, is_first_appearance)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (chapter_id, character_id, character_href, stock_change,
-              confidence_score, description, is_first_appearance))
-        self.conn.commit()
+        """, [(e['chapter_id'], e['character_id'], e['character_href'], e['stock_change'],
+               e['confidence_score'], e['description'], e.get('is_first_appearance', False))
+              for e in events])
+        self._invalidate_market_cache(min(e['chapter_id'] for e in events))
+        
+    def _invalidate_market_cache(self, chapter_id: int):
+        """Drop cached market snapshots that include the given chapter."""
+        for cache in (self._ranked_stocks_cache, self._statistics_cache):
+            for up_to_chapter in list(cache):
+                if not up_to_chapter or up_to_chapter >= chapter_id:
+                    del cache[up_to_chapter]
+        if self._totals_snapshot and self._totals_snapshot[0] >= chapter_id:
+            self._totals_snapshot = None
         
     def get_character_history(self, character_id: str, 
                              up_to_chapter: int = None,
                              limit: int = 3) -> List[Dict]:
-        """Get recent history for a character with cumulative stock values."""
-        cursor = self.conn.cursor()
-        
-        if up_to_chapter:
-            cursor.execute("""
-                SELECT me.*, c.chapter_id, c.title as chapter_title
-                FROM market_events me
-                JOIN chapters c ON me.chapter_id = c.chapter_id
-                WHERE me.character_id = ? AND me.chapter_id <= ?
-                ORDER BY me.chapter_id DESC
-                LIMIT ?
-            """, (character_id, up_to_chapter, limit))
-        else:
-            cursor.execute("""
-                SELECT me.*, c.chapter_id, c.title as chapter_title
-                FROM market_events me
-                JOIN chapters c ON me.chapter_id = c.chapter_id
-                WHERE me.character_id = ?
-                ORDER BY me.chapter_id DESC
-                LIMIT ?
-            """, (character_id, limit))
-            
-        history = [dict(row) for row in cursor.fetchall()]
+        """Get recent history for a character with cumulative stock values.
         
-        # Add cumulative stock value AFTER each event
-        for event in history:
-            event['current_stock'] = self.calculate_current_stock(character_id, event['chapter_id'])
-        
-        return history
+        The cumulative values come from get_character_histories' running
+        window sum rather than one calculate_current_stock call per event.
+        """
+        return self.get_character_histories([character_id], up_to_chapter,
+                                            limit).get(character_id, [])
         
     def calculate_current_stock(self, character_id: str, 
                                up_to_chapter: int = None) -> float:
         """Calculate cumulative stock value for a character (floor at 0)."""
         cursor = self.conn.cursor()
+        cursor.row_factory = None
         
-        # Get initial value
-        character = self.get_character(character_id)
-        if not character:
-            return 0.0
-            
-        initial_value = character['initial_stock_value']
-        
-        # Sum all changes up to this chapter
+        # Initial value plus all changes up to this chapter, in one lookup
+        chapter_filter = "AND chapter_id <= ?" if up_to_chapter else ""
+        params = [character_id]
         if up_to_chapter:
-            cursor.execute("""
-                SELECT SUM(stock_change) as total_change
-                FROM market_events
-                WHERE character_id = ? AND chapter_id <= ?
-            """, (character_id, up_to_chapter))
-        else:
-            cursor.execute("""
-                SELECT SUM(stock_change) as total_change
+            params.append(up_to_chapter)
+        params.append(character_id)
+        
+        cursor.execute(f"""
+            SELECT initial_stock_value + COALESCE((
+                SELECT SUM(stock_change)
                 FROM market_events
-                WHERE character_id = ?
-            """, (character_id,))
-            
+                WHERE character_id = ? {chapter_filter}
+            ), 0.0)
+            FROM characters
+            WHERE character_id = ?
+        """, params)
         row = cursor.fetchone()
-        total_change = row['total_change'] if row['total_change'] else 0.0
+        if not row:
+            return 0.0
         
         # Floor at 0
-        return max(0.0, initial_value + total_change)
+        return max(0.0, row[0])
+        
+    def calculate_current_stocks(self, character_ids: List[str],
+                                 up_to_chapter: int = None) -> Dict[str, float]:
+        """Calculate current stock values for several characters in one query.
+        
+        Same values as calculate_current_stock, keyed by character ID.
+        Characters that don't exist are left out.
+        """
+        if not character_ids:
+            return {}
         
-    def get_top_stocks(self, up_to_chapter: int = None, limit: int = 10) -> List[Dict]:
-        """Get top N stocks by current value."""
-        # Get all characters
         cursor = self.conn.cursor()
+        cursor.row_factory = None
+        chapter_filter = "AND me.chapter_id <= ?" if up_to_chapter else ""
+        # The IDs are bound as one JSON array rather than a placeholder per
+        # ID, so the SQL text (and the connection's cached statement) is
+        # the same however many characters are asked for
+        params = [dumps(list(character_ids))]
+        if up_to_chapter:
+            params.insert(0, up_to_chapter)
+        
+        cursor.execute(f"""
+            SELECT c.character_id, c.initial_stock_value,
+                   SUM(me.stock_change) as total_change
+            FROM characters c
+            LEFT JOIN market_events me
+                ON me.character_id = c.character_id {chapter_filter}
+            WHERE c.character_id IN (SELECT value FROM json_each(?))
+            GROUP BY c.character_id
+        """, params)
         
+        return {
+            char_id: max(0.0, initial_value + (total_change or 0.0))
+            for char_id, initial_value, total_change in cursor
+        }
+        
+    def get_character_histories(self, character_ids: List[str],
+                                up_to_chapter: int = None,
+                                limit: int = 3) -> Dict[str, List[Dict]]:
+        """Get recent history for several characters in one query.
+        
+        Same events as get_character_history, keyed by character ID. The
+        cumulative stock after each event's chapter comes from a running
+        window sum instead of one calculate_current_stock call per event.
+        """
+        if not character_ids:
+            return {}
+        
+        cursor = self.conn.cursor()
+        chapter_filter = "AND me.chapter_id <= ?" if up_to_chapter else ""
+        params = [dumps(list(character_ids))]
         if up_to_chapter:
-            cursor.execute("""
-                SELECT DISTINCT character_id 
-                FROM market_events 
-                WHERE chapter_id <= ?
-            """, (up_to_chapter,))
-        else:
-            cursor.execute("""
-                SELECT DISTINCT character_id 
-                FROM market_events
-            """)
-            
-        character_ids = [row['character_id'] for row in cursor.fetchall()]
+            params.append(up_to_chapter)
+        params.append(limit)
+        
+        cursor.execute(f"""
+            SELECT * FROM (
+                SELECT me.*, ch.title as chapter_title,
+                       c.initial_stock_value + SUM(me.stock_change) OVER (
+                           PARTITION BY me.character_id ORDER BY me.chapter_id
+                           RANGE UNBOUNDED PRECEDING
+                       ) as current_stock,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY me.character_id
+                           ORDER BY me.chapter_id DESC, me.event_id
+                       ) as history_rank
+                FROM market_events me
+                JOIN chapters ch ON me.chapter_id = ch.chapter_id
+                LEFT JOIN characters c ON c.character_id = me.character_id
+                WHERE me.character_id IN (SELECT value FROM json_each(?)) {chapter_filter}
+            )
+            WHERE history_rank <= ?
+            ORDER BY character_id, history_rank
+        """, params)
         
-        # Calculate current stock for each
-        stocks = []
-        for char_id in character_ids:
-            value = self.calculate_current_stock(char_id, up_to_chapter)
-            character = self.get_character(char_id)
-            stocks.append({
+        histories = defaultdict(list)
+        for row in cursor.fetchall():
+            event = dict(row)
+            del event['history_rank']
+            # Floor at 0 (unknown characters have no stock)
+            event['current_stock'] = max(0.0, event['current_stock'] or 0.0)
+            histories[event['character_id']].append(event)
+        
+        return dict(histories)
+        
+    def get_top_stocks(self, up_to_chapter: int = None, limit: int = 10) -> List[Dict]:
+        """Get top N stocks by current value."""
+        return [
+            {
                 'character_id': char_id,
-                'character_name': character['canonical_name'],
+                'character_name': name,
                 'stock_value': value
-            })
-            
-        # Sort and return top N
-        stocks.sort(key=lambda x: x['stock_value'], reverse=True)
-        return stocks[:limit]
+            }
+            for char_id, name, value in self._ranked_stocks(up_to_chapter)[:limit]
+        ]
+        
+    def _ranked_stocks(self, up_to_chapter: int = None) -> List[tuple]:
+        """Cached ranking from _rank_stocks (shared, don't modify it)."""
+        stocks = self._ranked_stocks_cache.get(up_to_chapter)
+        if stocks is None:
+            stocks = self._rank_stocks(up_to_chapter)
+            self._ranked_stocks_cache[up_to_chapter] = stocks
+        return stocks
+        
+    def _rank_stocks(self, up_to_chapter: int = None) -> List[tuple]:
+        """Rank every character with market events by current value.
+        
+        Entries are the (character_id, name, value) tuples of _current_stocks;
+        dicts are only built for the stocks get_top_stocks returns.
+        """
+        return sorted(self._current_stocks(up_to_chapter), key=itemgetter(2), reverse=True)
+        
+    def _current_stocks(self, up_to_chapter: int = None) -> List[tuple]:
+        """(character_id, name, current value) for every character with market events.
+        
+        Same values as calculate_current_stock, ordered by character ID.
+        """
+        totals = self._stock_totals(up_to_chapter)
+        
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute("""
+            SELECT character_id, canonical_name, initial_stock_value
+            FROM characters
+        """)
+        characters = {row[0]: row for row in cursor}
+        
+        stocks = []
+        for char_id in sorted(totals):
+            character = characters.get(char_id)
+            if character is None:
+                stocks.append((char_id, None, 0.0))
+            else:
+                stocks.append((char_id, character[1],
+                               max(0.0, character[2] + totals[char_id])))
+        return stocks
+        
+    def _stock_totals(self, up_to_chapter: int = None) -> Dict[str, float]:
+        """Summed stock changes per character up to a chapter (shared, don't modify it).
+        
+        Chapters are processed in order, so the totals for the previous
+        chapter are carried forward and only the newer events are summed,
+        instead of re-summing every event for each chapter.
+        """
+        snapshot = self._totals_snapshot
+        if up_to_chapter and snapshot and snapshot[0] == up_to_chapter:
+            return snapshot[1]
+        
+        if up_to_chapter and snapshot and snapshot[0] < up_to_chapter:
+            after_chapter, totals = snapshot[0], dict(snapshot[1])
+        else:
+            after_chapter, totals = None, {}
+        
+        conditions = []
+        params = []
+        if after_chapter:
+            conditions.append("chapter_id > ?")
+            params.append(after_chapter)
+        if up_to_chapter:
+            conditions.append("chapter_id <= ?")
+            params.append(up_to_chapter)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         
-    def get_market_statistics(self, up_to_chapter: int = None) -> Dict:
-        """Get market-wide statistics."""
         cursor = self.conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"""
+            SELECT character_id, SUM(stock_change)
+            FROM market_events
+            {where}
+            GROUP BY character_id
+        """, params)
+        for char_id, total_change in cursor:
+            totals[char_id] = totals.get(char_id, 0.0) + (total_change or 0.0)
         
         if up_to_chapter:
-            cursor.execute("""
-                SELECT DISTINCT character_id 
-                FROM market_events 
-                WHERE chapter_id <= ?
-            """, (up_to_chapter,))
+            self._totals_snapshot = (up_to_chapter, totals)
+        return totals
+        
+    def get_market_statistics(self, up_to_chapter: int = None) -> Dict:
+        """Get market-wide statistics."""
+        stats = self._statistics_cache.get(up_to_chapter)
+        if stats is None:
+            stats = self._calculate_market_statistics(up_to_chapter)
+            self._statistics_cache[up_to_chapter] = stats
+        return dict(stats)
+        
+    def iter_stock_values(self, up_to_chapter: int = None):
+        """Yield the current stock value of every character with market events.
+        
+        Same values as calculate_current_stock, in ascending order. They are
+        read backwards off the cached ranking, which is already sorted.
+        """
+        for _, _, value in reversed(self._ranked_stocks(up_to_chapter)):
+            yield value
+        
+    def _calculate_market_statistics(self, up_to_chapter: int = None) -> Dict:
+        """Calculate market-wide statistics from the database."""
+        # Values arrive sorted, so order statistics are read off by index
+        if np is not None:
+            stock_values = np.fromiter(self.iter_stock_values(up_to_chapter), dtype=float)
         else:
-            cursor.execute("""
-                SELECT DISTINCT character_id 
-                FROM market_events
-            """)
-            
-        character_ids = [row['character_id'] for row in cursor.fetchall()]
+            stock_values = list(self.iter_stock_values(up_to_chapter))
+        n = len(stock_values)
         
-        if not character_ids:
+        if not n:
             return {
                 'average': 0.0,
                 'median': 0.0,
                 'total_characters': 0
             }
         
-        # Calculate all stock values
-        stock_values = [
-            self.calculate_current_stock(char_id, up_to_chapter)
-            for char_id in character_ids
-        ]
+        # Mean of the two middle values when n is even
+        median = (stock_values[(n - 1) // 2] + stock_values[n // 2]) / 2
         
-        stock_values.sort()
-        n = len(stock_values)
+        if np is not None:
+            stats = {
+                'average': float(stock_values.mean()),
+                'median': float(median),
+                'total_characters': n
+            }
+            for p, value in zip(PERCENTILES, np.percentile(stock_values, PERCENTILES)):
+                stats[f'p{p}'] = float(value)
+            return stats
         
         def percentile(values, p):
             """Calculate percentile from sorted values."""
@@ -350,23 +775,28 @@ class Database:
                 return values[f] * (1 - c) + values[f + 1] * c
             return values[f]
         
-        return {
+        stats = {
             'average': sum(stock_values) / n if n > 0 else 0.0,
-            'median': stock_values[n // 2] if n > 0 else 0.0,
-            'total_characters': n,
-            'p10': percentile(stock_values, 0.10),
-            'p25': percentile(stock_values, 0.25),
-            'p33': percentile(stock_values, 0.33),
-            'p50': percentile(stock_values, 0.50),
-            'p66': percentile(stock_values, 0.66),
-            'p75': percentile(stock_values, 0.75),
-            'p90': percentile(stock_values, 0.90),
-            'p99': percentile(stock_values, 0.99)
+            'median': median,
+            'total_characters': n
         }
+        for p in PERCENTILES:
+            stats[f'p{p}'] = percentile(stock_values, p / 100)
+        return stats
+        
+    @_transactional
+    def save_market_context(self, chapter_id: int,
+                            active_characters: Optional[List[str]] = None):
+        """Save market context snapshot for a chapter.
         
-    def save_market_context(self, chapter_id: int):
-        """Save market context snapshot for a chapter."""
+        Args:
+            chapter_id: The chapter being processed
+            active_characters: IDs of the characters with events in the
+                               chapter, if already known (e.g. as returned
+                               by update_stock_history); queried otherwise
+        """
         cursor = self.conn.cursor()
+        cursor.row_factory = None
         
         # Get previous chapter
         prev_chapter = chapter_id - 1 if chapter_id > 1 else None
@@ -378,12 +808,8 @@ class Database:
         stats = self.get_market_statistics(up_to_chapter=prev_chapter)
         
         # Get active characters (characters in this chapter)
-        cursor.execute("""
-            SELECT DISTINCT character_id 
-            FROM market_events 
-            WHERE chapter_id = ?
-        """, (chapter_id,))
-        active_characters = [row['character_id'] for row in cursor.fetchall()]
+        if active_characters is None:
+            active_characters = self.get_all_characters_in_chapter(chapter_id)
         
         # Get arc name from chapter
         chapter = self.get_chapter(chapter_id)
@@ -391,21 +817,30 @@ class Database:
         
         # Save context
         cursor.execute("""
-            INSERT OR REPLACE INTO market_context
+            INSERT INTO market_context
             (chapter_id, top_ten_stocks, active_characters, arc_name,
              average_stock_value, median_stock_value, total_characters)
             VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (chapter_id, json.dumps(top_ten), json.dumps(active_characters),
+            ON CONFLICT(chapter_id) DO UPDATE SET
+                top_ten_stocks = excluded.top_ten_stocks,
+                active_characters = excluded.active_characters,
+                arc_name = excluded.arc_name,
+                average_stock_value = excluded.average_stock_value,
+                median_stock_value = excluded.median_stock_value,
+                total_characters = excluded.total_characters
+        """, (chapter_id, dumps(top_ten), dumps(active_characters),
               arc_name, stats['average'], stats['median'], stats['total_characters']))
         
-        self.conn.commit()
-        
-    def update_stock_history(self, chapter_id: int, character_reasonings: dict = None):
+    @_transactional
+    def update_stock_history(self, chapter_id: int, character_reasonings: dict = None) -> List[str]:
         """Update stock history for all characters after processing a chapter.
         
         Args:
             chapter_id: The chapter being processed
             character_reasonings: Dict mapping character_id to chapter-level reasoning text
+            
+        Returns:
+            IDs of the characters with events in the chapter
         """
         cursor = self.conn.cursor()
         
@@ -413,45 +848,59 @@ class Database:
             character_reasonings = {}
         
         # Get all characters with events in this chapter
+        cursor.row_factory = None
         cursor.execute("""
             SELECT character_id, SUM(stock_change) as total_change
             FROM market_events
             WHERE chapter_id = ?
             GROUP BY character_id
         """, (chapter_id,))
+        rows = cursor.fetchall()
+        
+        # Market rank and cumulative value for all of them, read off the
+        # ranking for this chapter (which already holds every value) rather
+        # than queried again
+        ranked = {
+            char_id: (i + 1, value)
+            for i, (char_id, _, value) in enumerate(self._ranked_stocks(chapter_id))
+        }
         
-        for row in cursor.fetchall():
-            character_id = row['character_id']
-            chapter_change = row['total_change']
-            
-            # Calculate cumulative value
-            cumulative_value = self.calculate_current_stock(character_id, chapter_id)
+        history_rows = []
+        for character_id, chapter_change in rows:
             
-            # Get market rank
-            top_stocks = self.get_top_stocks(up_to_chapter=chapter_id, limit=999999)
-            rank = next((i + 1 for i, s in enumerate(top_stocks) 
-                        if s['character_id'] == character_id), None)
+            # Get market rank and cumulative value
+            rank, cumulative_value = ranked.get(character_id, (None, 0.0))
             
             # Get reasoning for this character
             reasoning = character_reasonings.get(character_id, None)
             
-            # Save to history
-            cursor.execute("""
-                INSERT OR REPLACE INTO character_stock_history
-                (character_id, chapter_id, cumulative_stock_value, 
-                 chapter_change, market_rank, chapter_reasoning)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (character_id, chapter_id, cumulative_value, chapter_change, rank, reasoning))
+            history_rows.append((character_id, chapter_id, cumulative_value,
+                                 chapter_change, rank, reasoning))
             
-        self.conn.commit()
+        # Save to history in one batch. Reprocessed chapters update their
+        # rows in place rather than REPLACE deleting and reinserting them.
+        cursor.executemany("""
+            INSERT INTO character_stock_history
+            (character_id, chapter_id, cumulative_stock_value, 
+             chapter_change, market_rank, chapter_reasoning)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(character_id, chapter_id) DO UPDATE SET
+                cumulative_stock_value = excluded.cumulative_stock_value,
+                chapter_change = excluded.chapter_change,
+                market_rank = excluded.market_rank,
+                chapter_reasoning = excluded.chapter_reasoning
+        """, history_rows)
+        
+        return [row[0] for row in history_rows]
         
     def get_all_characters_in_chapter(self, chapter_id: int) -> List[str]:
         """Get all character IDs that appear in a chapter."""
         cursor = self.conn.cursor()
+        cursor.row_factory = None
         cursor.execute("""
             SELECT DISTINCT character_id 
             FROM market_events 
             WHERE chapter_id = ?
         """, (chapter_id,))
-        return [row['character_id'] for row in cursor.fetchall()]
+        return [row[0] for row in cursor]
 
@@ -2,7 +2,6 @@
 
 from database import Database
 from wiki_crawler import WikiCrawler
-from llm_analyzer import LLMAnalyzer
 
 
 def example_database_queries():
@@ -11,7 +10,7 @@ def example_database_queries():
     print("Example Database Queries")
     print("="*80)
     
-    with Database() as db:
+    with Database(read_only=True) as db:
         # Get top 10 stocks
         print("\n📈 Top 10 Current Stocks:")
         top_stocks = db.get_top_stocks(limit=10)
@@ -2,15 +2,15 @@
 
 import argparse
 import sys
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple
 from dotenv import load_dotenv
 from database import Database
-from wiki_crawler import WikiCrawler
-from llm_analyzer import LLMAnalyzer
 
 # Load environment variables from .env file
 load_dotenv()
 
+STOCK_FLOOR = 10.0  # Minimum stock to prevent death spirals
+
 
 class DataGenerator:
     """Orchestrates the offline data generation process."""
@@ -19,7 +19,13 @@ class DataGenerator:
                  openai_api_key: Optional[str] = None,
                  openai_model: str = "gpt-5-nano-2025-08-07",
                  crawler_delay: float = 1.0,
-                 verbose: bool = True):
+                 verbose: bool = True,
+                 llm_cache_dir: Optional[str] = None,
+                 llm_workers: int = 4,
+                 html_cache_dir: Optional[str] = None,
+                 batch_size: int = 1,
+                 summary_tokens: int = 2000,
+                 crawl_workers: int = 1):
         """
         Initialize the data generator.
         
@@ -29,11 +35,64 @@ class DataGenerator:
             openai_model: OpenAI model to use
             crawler_delay: Delay between wiki requests
             verbose: If True, print prompts and responses
+            llm_cache_dir: Directory for cached LLM responses (None disables caching)
+            llm_workers: Number of characters analyzed concurrently per chapter
+            html_cache_dir: Directory for cached wiki pages (None disables caching)
+            batch_size: Number of crawled chapters whose character filtering
+                        shares one LLM call (1 filters each chapter separately)
+            summary_tokens: Token budget for chapter summaries sent to the
+                            LLM (0 sends them in full)
+            crawl_workers: Number of wiki pages fetched concurrently
         """
-        self.db = Database(db_path)
-        self.crawler = WikiCrawler(delay=crawler_delay)
-        self.analyzer = LLMAnalyzer(api_key=openai_api_key, model=openai_model)
+        # One connection for the whole run, reused by every `with self.db`
+        self.db = Database(db_path, keep_open=True)
         self.verbose = verbose
+        self.batch_size = max(1, batch_size)
+        self.crawl_workers = max(1, crawl_workers)
+        
+        # The crawler and analyzer (and their requests/bs4/openai imports)
+        # are created on first use, so e.g. --init needs neither an API key
+        # nor those packages
+        self._crawler_options = {'delay': crawler_delay, 'cache_dir': html_cache_dir}
+        self._analyzer_options = {'api_key': openai_api_key, 'model': openai_model,
+                                  'cache_dir': llm_cache_dir, 'max_workers': llm_workers,
+                                  'summary_tokens': summary_tokens}
+        self._crawler = None
+        self._analyzer = None
+        
+    @property
+    def crawler(self):
+        """Wiki crawler, created on first use."""
+        if self._crawler is None:
+            from wiki_crawler import WikiCrawler
+            self._crawler = WikiCrawler(**self._crawler_options)
+        return self._crawler
+        
+    @property
+    def analyzer(self):
+        """LLM analyzer, created on first use."""
+        if self._analyzer is None:
+            from llm_analyzer import LLMAnalyzer
+            self._analyzer = LLMAnalyzer(**self._analyzer_options)
+        return self._analyzer
+        
+    def close(self):
+        """Release the crawler and analyzer HTTP sessions and the database."""
+        if self._crawler is not None:
+            self._crawler.close()
+            self._crawler = None
+        if self._analyzer is not None:
+            self._analyzer.close()
+            self._analyzer = None
+        self.db.close()
+        
+    def __enter__(self):
+        """Context manager entry."""
+        return self
+        
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Context manager exit."""
+        self.close()
         
     def initialize(self):
         """Initialize the database schema."""
@@ -71,19 +130,30 @@ class DataGenerator:
             # Collect past 3 changes for characters in this chapter (for market context)
             chapter_character_history = []
             
+            # Stocks and recent history for every character in the chapter,
+            # fetched in bulk rather than with several queries per character.
+            # Existence is decided the same way as in process_chapter: by
+            # whether the character is in the characters table.
+            current_stocks = {}
+            recent_histories = {}
+            if prev_chapter:
+                character_ids = [char['character_id'] for char in characters_in_chapter]
+                current_stocks = db.calculate_current_stocks(character_ids, prev_chapter)
+                recent_histories = db.get_character_histories(character_ids,
+                                                              up_to_chapter=prev_chapter,
+                                                              limit=3)
+            
             for char in characters_in_chapter:
                 char_id = char['character_id']
                 
                 # Check if character appeared in PREVIOUS chapters (not just exists in DB)
-                if prev_chapter and db.character_exists(char_id):
+                if prev_chapter and char_id in current_stocks:
                     # Check if they have any history before this chapter
-                    current_stock = db.calculate_current_stock(char_id, prev_chapter)
+                    current_stock = current_stocks[char_id]
                     
                     # Only mark as existing if they have stock from previous chapters
                     if current_stock > 0:
-                        recent_history = db.get_character_history(char_id, 
-                                                                  up_to_chapter=prev_chapter,
-                                                                  limit=3)
+                        recent_history = recent_histories.get(char_id, [])
                         
                         existing_characters.append({
                             'character_id': char_id,
@@ -95,7 +165,7 @@ class DataGenerator:
                         
                         # Add to chapter character history for market context
                         if recent_history:
-                            for event in recent_history[:3]:
+                            for event in recent_history:  # at most 3, see limit above
                                 stock_after = event.get('current_stock', 0)
                                 delta = event.get('stock_change', 0)
                                 description = event.get('description', '') or event.get('reasoning', '')
@@ -151,12 +221,13 @@ class DataGenerator:
             'chapter_character_history': chapter_character_history
         }
         
-    def process_chapter(self, chapter_data: Dict) -> bool:
+    def process_chapter(self, chapter_data: Dict, keep_names: Optional[set] = None) -> bool:
         """
         Process a single chapter.
         
         Args:
             chapter_data: Chapter data from crawler
+            keep_names: Character names already kept by a batched filter call
             
         Returns:
             True if successful, False otherwise
@@ -195,7 +266,8 @@ class DataGenerator:
             stock_changes = self.analyzer.analyze_chapter(
                 chapter_data, 
                 market_context,
-                verbose=self.verbose
+                verbose=self.verbose,
+                keep_names=keep_names
             )
         except Exception as e:
             print(f"\n❌ CRITICAL ERROR: LLM analysis failed after all retries")
@@ -212,14 +284,20 @@ class DataGenerator:
         # Per-character analysis already validated, no need for batch validation
         validated_changes = stock_changes
         
+        # Stock before this chapter for every changed character, fetched in
+        # one query. Characters missing from it are new.
+        changed_ids = [self.crawler.extract_character_id_from_href(change['character_href'])
+                       for change in validated_changes]
+        with self.db as db:
+            stocks_before = db.calculate_current_stocks(changed_ids, chapter_id - 1)
+        
         if self.verbose:
             print("\n" + "="*80)
             print("📊 VALIDATED STOCK CHANGES")
             print("="*80)
             for change in validated_changes:
                 char_id = self.crawler.extract_character_id_from_href(change['character_href'])
-                with self.db as db:
-                    is_new = not db.character_exists(char_id)
+                is_new = char_id not in stocks_before
                 
                 print(f"\n{change['character_name']}:")
                 if is_new:
@@ -239,6 +317,10 @@ class DataGenerator:
         # Save to database
         character_reasonings = {}  # Store chapter-level reasonings for update_stock_history
         
+        # Rows are collected and written in one batch per table
+        new_characters = []
+        market_events = []
+        
         with self.db as db:
             for change in validated_changes:
                 # Extract character ID from href
@@ -249,7 +331,7 @@ class DataGenerator:
                     character_reasonings[char_id] = change['reasoning']
                 
                 # Check if this is a first appearance
-                is_new = not db.character_exists(char_id)
+                is_new = char_id not in stocks_before
                 
                 if is_new:
                     # For new characters, stock_change IS their initial value
@@ -262,17 +344,19 @@ class DataGenerator:
                             print(f"  ⏭️  Skipping {change['character_name']} (stock {initial_value:.1f} too low, likely insignificant)")
                         continue
                         
-                    db.save_character(
+                    new_characters.append(dict(
                         character_id=char_id,
                         canonical_name=change['character_name'],
                         href=change['character_href'],
                         first_appearance_chapter=chapter_id,
                         initial_stock_value=initial_value
-                    )
-                    print(f"  New character: {change['character_name']} starting at {initial_value:.1f}")
+                    ))
+                    if self.verbose:
+                        print(f"  New character: {change['character_name']} starting at {initial_value:.1f}")
+                    stocks_before[char_id] = initial_value
                     
                     # For new characters, save a market event with 0 change (initial value is stored separately)
-                    db.save_market_event(
+                    market_events.append(dict(
                         chapter_id=chapter_id,
                         character_id=char_id,
                         character_href=change['character_href'],
@@ -280,7 +364,7 @@ class DataGenerator:
                         confidence_score=change['confidence'],
                         description=change['reasoning'],
                         is_first_appearance=True
-                    )
+                    ))
                 else:
                     # For existing characters, stock_change is a MULTIPLIER
                     multiplier = change['stock_change']
@@ -290,13 +374,12 @@ class DataGenerator:
                         print(f"  WARNING: {change['character_name']} has invalid multiplier {multiplier:.2f}, clamping to valid range")
                         multiplier = max(0.05, min(5.0, multiplier))
                     
-                    current_stock = db.calculate_current_stock(char_id, chapter_id - 1)
+                    current_stock = stocks_before[char_id]
                     
                     # Save individual actions as market events
                     if 'actions' in change and change['actions']:
                         # Calculate per-action stock changes
                         running_stock = current_stock
-                        STOCK_FLOOR = 10.0  # Minimum stock to prevent death spirals
                         
                         for action in change['actions']:
                             action_multiplier = action['multiplier']
@@ -310,7 +393,7 @@ class DataGenerator:
                             
                             action_delta = new_stock - running_stock
                             
-                            db.save_market_event(
+                            market_events.append(dict(
                                 chapter_id=chapter_id,
                                 character_id=char_id,
                                 character_href=change['character_href'],
@@ -318,12 +401,11 @@ class DataGenerator:
                                 confidence_score=change['confidence'],
                                 description=action['description'],
                                 is_first_appearance=False
-                            )
+                            ))
                             
                             running_stock = new_stock
                     else:
                         # Fallback: no individual actions, save one event with total change
-                        STOCK_FLOOR = 10.0  # Minimum stock to prevent death spirals
                         new_stock = current_stock * multiplier
                         
                         # Enforce stock floor
@@ -334,7 +416,7 @@ class DataGenerator:
                         
                         delta = new_stock - current_stock
                         
-                        db.save_market_event(
+                        market_events.append(dict(
                             chapter_id=chapter_id,
                             character_id=char_id,
                             character_href=change['character_href'],
@@ -342,29 +424,74 @@ class DataGenerator:
                             confidence_score=change['confidence'],
                             description=change.get('reasoning', 'No description available'),
                             is_first_appearance=False
-                        )
+                        ))
                     
                     # Log the change
-                    final_stock = current_stock * multiplier
-                    if final_stock < 10.0:
-                        final_stock = 10.0
-                    delta = final_stock - current_stock
-                    print(f"  {change['character_name']}: {current_stock:.1f} × {multiplier:.2f} = {final_stock:.1f} ({delta:+.1f})")
-            
-            # Update stock history with chapter-level reasonings
-            print("Updating stock history...")
-            db.update_stock_history(chapter_id, character_reasonings)
+                    if self.verbose:
+                        final_stock = current_stock * multiplier
+                        if final_stock < STOCK_FLOOR:
+                            final_stock = STOCK_FLOOR
+                        delta = final_stock - current_stock
+                        print(f"  {change['character_name']}: {current_stock:.1f} × {multiplier:.2f} = {final_stock:.1f} ({delta:+.1f})")
             
-            # Save market context
-            print("Saving market context...")
-            db.save_market_context(chapter_id)
-            
-            # Mark chapter as processed
-            db.mark_chapter_processed(chapter_id)
+            # Every write for the chapter commits together, so an
+            # interrupted run never leaves a chapter half saved
+            print(f"Saving {len(new_characters)} new characters and {len(market_events)} market events...")
+            with db.transaction():
+                db.save_characters(new_characters)
+                db.save_market_events(market_events)
+                
+                # Update stock history with chapter-level reasonings
+                print("Updating stock history...")
+                active_characters = db.update_stock_history(chapter_id, character_reasonings)
+                
+                # Save market context
+                print("Saving market context...")
+                db.save_market_context(chapter_id, active_characters)
+                
+                # Mark chapter as processed
+                db.mark_chapter_processed(chapter_id)
             
         print(f"Chapter {chapter_id} processed successfully")
         return True
         
+    def batch_filter(self, chapters: Iterable[Dict]) -> Iterator[Tuple[Dict, Optional[set]]]:
+        """
+        Pair crawled chapters with their filtered character names.
+        
+        With batch_size > 1, chapters are gathered into groups and each
+        group's character lists are filtered in a single LLM call. Chapters
+        are still yielded (and processed) one at a time, in order.
+        
+        Yields:
+            (chapter_data, keep_names) tuples; keep_names is None when the
+            chapter should be filtered on its own
+        """
+        if self.batch_size <= 1:
+            for chapter_data in chapters:
+                yield chapter_data, None
+            return
+        
+        batch = []
+        for chapter_data in chapters:
+            batch.append(chapter_data)
+            if len(batch) >= self.batch_size:
+                yield from self._filter_batch(batch)
+                batch = []
+        if batch:
+            yield from self._filter_batch(batch)
+            
+    def _filter_batch(self, batch: List[Dict]) -> List[Tuple[Dict, Optional[set]]]:
+        """Filter one group of chapters, skipping chapters already processed."""
+        with self.db as db:
+            pending = [c for c in batch if not db.is_chapter_processed(c['chapter_id'])]
+        
+        kept = dict(zip(
+            (c['chapter_id'] for c in pending),
+            self.analyzer.filter_characters_batch(pending, verbose=self.verbose)
+        ))
+        return [(c, kept.get(c['chapter_id'])) for c in batch]
+        
     def generate_data(self, start_chapter: int = 1,
                      end_chapter: Optional[int] = None,
                      max_chapters: Optional[int] = None,
@@ -426,27 +553,33 @@ class DataGenerator:
                 
                 self.process_chapter(chapter_data)
         else:
-            # Crawl chapters from wiki
+            # Crawl chapters from wiki. The crawler runs a few chapters ahead
+            # in the background, so each chapter's crawl overlaps with the
+            # LLM analysis of the previous one.
             print(f"Crawling chapters from wiki...")
-            chapters_data = self.crawler.crawl_chapters(
+            chapter_urls = self.crawler.get_chapter_urls(
                 start_chapter=start_chapter,
                 end_chapter=end_chapter,
                 max_chapters=max_chapters
             )
             
-            if not chapters_data:
+            if not chapter_urls:
                 print("No chapters crawled")
                 return
                 
-            print(f"\nProcessing {len(chapters_data)} chapters...")
+            print(f"\nProcessing {len(chapter_urls)} chapters...")
+            
+            chapters = self.crawler.iter_chapters(chapter_urls, workers=self.crawl_workers)
+            processed_any = False
             
-            for i, chapter_data in enumerate(chapters_data, 1):
+            for i, (chapter_data, keep_names) in enumerate(self.batch_filter(chapters), 1):
+                processed_any = True
                 print(f"\n{'='*80}")
-                print(f"Progress: {i}/{len(chapters_data)}")
+                print(f"Progress: {i}/{len(chapter_urls)}")
                 print(f"{'='*80}")
                 
                 try:
-                    success = self.process_chapter(chapter_data)
+                    success = self.process_chapter(chapter_data, keep_names)
                     
                     if not success:
                         print(f"❌ Failed to process chapter {chapter_data['chapter_id']}")
@@ -467,7 +600,15 @@ class DataGenerator:
                     import traceback
                     traceback.print_exc()
                     print(f"Run stopped at chapter {chapter_data['chapter_id']}")
+                    chapters.close()
                     return
+            
+            # Stop the background crawler if we left the loop early
+            chapters.close()
+            
+            if not processed_any:
+                print("No chapters crawled")
+                return
                         
         print("\n" + "="*80)
         print("Data generation complete!")
@@ -485,6 +626,11 @@ class DataGenerator:
             print(f"\nTop 10 Stocks:")
             for i, stock in enumerate(top_ten, 1):
                 print(f"{i:2d}. {stock['character_name']:<30s} {stock['stock_value']:>8.1f}")
+        
+        if self._analyzer and self._analyzer.cache:
+            cache_stats = self.analyzer.cache.stats()
+            print(f"\nLLM cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+                  f"({cache_stats['hit_rate']:.0%} hit rate)")
 
 
 def main():
@@ -520,6 +666,10 @@ def main():
         '--delay', type=float, default=1.0,
         help='Delay between wiki requests in seconds (default: 1.0)'
     )
+    parser.add_argument(
+        '--crawl-workers', type=int, default=1,
+        help='Number of wiki pages fetched concurrently, each still waiting --delay (default: 1)'
+    )
     parser.add_argument(
         '--init', action='store_true',
         help='Initialize database schema'
@@ -528,6 +678,26 @@ def main():
         '--skip-crawl', action='store_true',
         help='Skip web crawling, use existing chapter data in database'
     )
+    parser.add_argument(
+        '--llm-cache', type=str, nargs='?', const='llm_cache', default=None,
+        help='Reuse cached LLM responses for identical requests (default dir: llm_cache)'
+    )
+    parser.add_argument(
+        '--html-cache', type=str, nargs='?', const='html_cache', default=None,
+        help='Keep gzipped copies of crawled wiki pages for reruns (default dir: html_cache)'
+    )
+    parser.add_argument(
+        '--batch-size', type=int, default=1,
+        help='Filter the characters of this many crawled chapters in one LLM call (default: 1)'
+    )
+    parser.add_argument(
+        '--summary-tokens', type=int, default=2000,
+        help='Trim chapter summaries sent to the LLM to this many tokens, 0 for no limit (default: 2000)'
+    )
+    parser.add_argument(
+        '--llm-workers', type=int, default=4,
+        help='Number of characters analyzed concurrently per chapter (default: 4)'
+    )
     parser.add_argument(
         '--verbose', '-v', action='store_true',
         help='Print prompts and LLM responses to console for monitoring'
@@ -549,28 +719,34 @@ def main():
     if args.verbose:
         verbose = True
     
-    # Create generator
-    generator = DataGenerator(
+    # Create generator (closes its HTTP sessions and database on exit)
+    with DataGenerator(
         db_path=args.db,
         openai_model=args.model,
         crawler_delay=args.delay,
-        verbose=verbose
-    )
-    
-    # Initialize if requested
-    if args.init:
-        generator.initialize()
-        print("Database initialized. Run without --init to generate data.")
-        return
-        
-    # Generate data
-    generator.generate_data(
-        start_chapter=args.start,
-        end_chapter=args.end,
-        max_chapters=args.max,
-        skip_crawl=args.skip_crawl,
-        chapter_list=chapter_list
-    )
+        verbose=verbose,
+        llm_cache_dir=args.llm_cache,
+        llm_workers=args.llm_workers,
+        html_cache_dir=args.html_cache,
+        batch_size=args.batch_size,
+        summary_tokens=args.summary_tokens,
+        crawl_workers=args.crawl_workers
+    ) as generator:
+        
+        # Initialize if requested
+        if args.init:
+            generator.initialize()
+            print("Database initialized. Run without --init to generate data.")
+            return
+        
+        # Generate data
+        generator.generate_data(
+            start_chapter=args.start,
+            end_chapter=args.end,
+            max_chapters=args.max,
+            skip_crawl=args.skip_crawl,
+            chapter_list=chapter_list
+        )
 
 
 if __name__ == "__main__":
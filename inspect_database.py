@@ -87,7 +87,7 @@ def print_chapter_summary(db: Database, chapter_id: int):
             ORDER BY ABS(me.stock_change) DESC
         """, (chapter_id,))
         
-        events = [dict(row) for row in cursor.fetchall()]
+        events = cursor.fetchall()
         
         print(f"\n💹 Stock Movements ({len(events)} characters):")
         print(f"{'Character':<30} {'Change':>10} {'New Value':>12} {'Confidence':>10}")
@@ -123,45 +123,35 @@ def print_top_movers(db: Database, up_to_chapter: Optional[int] = None, limit: i
     
     cursor = db.conn.cursor()
     
-    # Get most recent change for each character
-    if up_to_chapter:
-        cursor.execute("""
-            SELECT 
-                me.character_id,
-                c.canonical_name,
-                me.stock_change,
-                me.chapter_id,
-                me.description
-            FROM market_events me
-            JOIN characters c ON me.character_id = c.character_id
-            WHERE me.chapter_id <= ? AND me.chapter_id IN (
-                SELECT MAX(chapter_id) 
-                FROM market_events 
-                WHERE character_id = me.character_id AND chapter_id <= ?
-            )
-            ORDER BY ABS(me.stock_change) DESC
-            LIMIT ?
-        """, (up_to_chapter, up_to_chapter, limit))
-    else:
-        cursor.execute("""
-            SELECT 
-                me.character_id,
-                c.canonical_name,
-                me.stock_change,
-                me.chapter_id,
-                me.description
-            FROM market_events me
-            JOIN characters c ON me.character_id = c.character_id
-            WHERE me.chapter_id IN (
-                SELECT MAX(chapter_id) 
-                FROM market_events 
-                WHERE character_id = me.character_id
-            )
-            ORDER BY ABS(me.stock_change) DESC
-            LIMIT ?
-        """, (limit,))
-        
-    movers = [dict(row) for row in cursor.fetchall()]
+    # Get most recent change for each character. The latest chapter per
+    # character is found in one grouped pass and joined back, rather than
+    # by a correlated subquery evaluated for every event.
+    chapter_filter = "WHERE chapter_id <= ?" if up_to_chapter else ""
+    params = [up_to_chapter] if up_to_chapter else []
+    params.append(limit)
+    
+    cursor.execute(f"""
+        SELECT 
+            me.character_id,
+            c.canonical_name,
+            me.stock_change,
+            me.chapter_id,
+            me.description
+        FROM (
+            SELECT character_id, MAX(chapter_id) as last_chapter
+            FROM market_events
+            {chapter_filter}
+            GROUP BY character_id
+        ) latest
+        JOIN market_events me
+            ON me.character_id = latest.character_id
+            AND me.chapter_id = latest.last_chapter
+        JOIN characters c ON me.character_id = c.character_id
+        ORDER BY ABS(me.stock_change) DESC
+        LIMIT ?
+    """, params)
+    
+    movers = cursor.fetchall()
     
     print(f"\n{'Character':<30} {'Chapter':>8} {'Change':>10} {'Description':<30}")
     print("-" * 80)
@@ -179,26 +169,30 @@ def list_all_characters(db: Database):
     print("="*80)
     
     cursor = db.conn.cursor()
+    total = cursor.execute("SELECT COUNT(*) FROM characters").fetchone()[0]
+    
+    # Current values are summed in the same query, and rows are printed as
+    # the cursor yields them rather than collected into a list first
     cursor.execute("""
         SELECT 
-            character_id,
-            canonical_name,
-            first_appearance_chapter,
-            initial_stock_value
-        FROM characters
-        ORDER BY first_appearance_chapter, canonical_name
+            c.character_id,
+            c.canonical_name,
+            c.first_appearance_chapter,
+            c.initial_stock_value,
+            MAX(0.0, c.initial_stock_value + COALESCE(SUM(me.stock_change), 0.0)) as current_stock
+        FROM characters c
+        LEFT JOIN market_events me ON me.character_id = c.character_id
+        GROUP BY c.character_id
+        ORDER BY c.first_appearance_chapter, c.canonical_name
     """)
     
-    characters = [dict(row) for row in cursor.fetchall()]
-    
-    print(f"\nTotal: {len(characters)} characters")
+    print(f"\nTotal: {total} characters")
     print(f"\n{'Character':<35} {'First Ch.':>10} {'Initial':>10} {'Current':>10}")
     print("-" * 80)
     
-    for char in characters:
-        current = db.calculate_current_stock(char['character_id'])
+    for char in cursor:
         print(f"{char['canonical_name']:<35} {char['first_appearance_chapter']:>10} "
-              f"{char['initial_stock_value']:>10.1f} {current:>10.1f}")
+              f"{char['initial_stock_value']:>10.1f} {char['current_stock']:>10.1f}")
 
 
 def main():
@@ -237,7 +231,7 @@ def main():
     if not any([args.character, args.chapter, args.movers, args.list_all, args.summary]):
         args.summary = True
     
-    with Database(args.db) as db:
+    with Database(args.db, read_only=True) as db:
         if args.summary:
             print_market_summary(db)
             
@@ -0,0 +1,90 @@
+"""Disk cache for LLM responses."""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class LLMCache:
+    """Stores raw LLM responses on disk, keyed by a hash of the request.
+    
+    Re-running chapters with identical inputs (e.g. resuming after a failed
+    run) then reuses the earlier responses instead of calling the API again.
+    """
+    
+    def __init__(self, cache_dir: str = "llm_cache"):
+        """
+        Initialize the cache.
+        
+        Args:
+            cache_dir: Directory holding the cached responses
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        
+    def key(self, model: str, system_prompt: str, user_prompt: str,
+            temperature: float) -> str:
+        """Build the cache key for a chat completion request.
+        
+        The request fields are hashed directly, without being serialized into
+        one payload first, so keys are stable across runs and processes.
+        """
+        digest = hashlib.blake2b(digest_size=32)
+        for part in (model, system_prompt, user_prompt, repr(float(temperature))):
+            data = part.encode('utf-8')
+            # Length prefixes keep differently split fields from colliding
+            digest.update(len(data).to_bytes(8, 'little'))
+            digest.update(data)
+        return digest.hexdigest()
+        
+    def _path(self, key: str) -> Path:
+        # Two-character fan-out keeps directories small
+        return self.cache_dir / key[:2] / f"{key}.json"
+        
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response content, or None on a miss."""
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as f:
+                content = json.load(f)['content']
+        except (OSError, ValueError, KeyError):
+            content = None
+        
+        with self._lock:
+            if content is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return content
+        
+    def set(self, key: str, content: str):
+        """Store response content. Only call this once it parsed successfully."""
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        
+        # Write then rename so an interrupted run never leaves a partial file
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'content': content}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        
+    def discard(self, key: str):
+        """Remove an entry (e.g. a cached response that failed validation)."""
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+            
+    def stats(self) -> Dict:
+        """Get hit/miss counts for this run."""
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0
+        }
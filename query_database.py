@@ -1,46 +1,89 @@
 #!/usr/bin/env python3
 """
 Simple database query script for the web interface.
-Usage: python3 query_database.py "SQL_QUERY"
+Usage: python3 query_database.py "SQL_QUERY" ["SQL_QUERY" ...]
+       python3 query_database.py --serve
+
+When several queries are given they all run over a single connection and the
+output is a JSON array holding one result list per query.
+
+With --serve the script stays alive as a query worker for the web server: it
+keeps one read-only connection open and answers newline-delimited JSON
+requests ({"id": 1, "queries": ["SQL", ...]}) read from stdin with one JSON
+line per request ({"id": 1, "results": [...]} or {"id": 1, "error": "..."}).
+A query may also be {"sql": "SQL", "params": [...]} to bind values to its
+placeholders; keeping the SQL text fixed lets the connection's statement
+cache skip re-parsing it on later requests.
 """
 
 import sys
 import json
-from database import Database
+from database import Database, dumps, loads
+
+
+def run_query(db: Database, query) -> list:
+    """Execute a query (SQL string or {"sql", "params"} dict) and return its rows as a list of dicts."""
+    if isinstance(query, dict):
+        sql, params = query['sql'], query.get('params') or []
+    else:
+        sql, params = query, []
+    
+    # Plain tuples are cheaper than sqlite3.Row; rows are keyed by position
+    cursor = db.conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    
+    if cursor.description is None:
+        return []
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+def serve(db_path: str = "one_piece_stocks.db"):
+    """Answer query requests from stdin until it is closed."""
+    db = Database(db_path)
+    db.connect(read_only=True)
+    
+    try:
+        for line in iter(sys.stdin.readline, ''):
+            if not line.strip():
+                continue
+            
+            request_id = None
+            try:
+                request = loads(line)
+                request_id = request.get('id')
+                results = [run_query(db, query) for query in request['queries']]
+                response = {"id": request_id, "results": results}
+            except Exception as e:
+                response = {"id": request_id, "error": str(e)}
+            
+            sys.stdout.write(dumps(response) + "\n")
+            sys.stdout.flush()
+    finally:
+        db.close()
+
 
 def main():
     if len(sys.argv) < 2:
         print(json.dumps({"error": "No query provided"}))
         sys.exit(1)
     
-    query = sys.argv[1]
-    db = Database("one_piece_stocks.db")
+    if sys.argv[1] == '--serve':
+        serve()
+        return
+    
+    queries = sys.argv[1:]
     
     try:
-        # Execute the query using the Database class method
-        import sqlite3
-        conn = sqlite3.connect("one_piece_stocks.db")
-        cursor = conn.cursor()
-        cursor.execute(query)
+        # One connection for every query in this request
+        with Database("one_piece_stocks.db", read_only=True) as db:
+            results = [run_query(db, query) for query in queries]
         
-        # Fetch results
-        rows = cursor.fetchall()
-        columns = [description[0] for description in cursor.description]
-        
-        # Convert to list of dicts
-        result = []
-        for row in rows:
-            row_dict = {}
-            for i, col in enumerate(columns):
-                row_dict[col] = row[i]
-            result.append(row_dict)
-        
-        conn.close()
-        print(json.dumps(result))
+        print(dumps(results[0] if len(queries) == 1 else results))
     except Exception as e:
         print(json.dumps({"error": str(e)}))
         sys.exit(1)
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,34 @@
+"""Tests for llm_analyzer.trim_to_tokens."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+pytest.importorskip("openai")
+pytest.importorskip("dotenv")
+
+from llm_analyzer import count_tokens, trim_to_tokens
+
+
+def test_text_within_budget_is_unchanged():
+    text = "Luffy eats the Gum-Gum Fruit. Shanks loses an arm."
+    assert trim_to_tokens(text, 1000) == text
+
+
+def test_keeps_sentences_mentioning_keywords():
+    text = " ".join(["Filler sentence number %d here." % i for i in range(40)]
+                    + ["Zoro draws his swords."])
+    trimmed = trim_to_tokens(text, 20, keywords=["Zoro"])
+    assert "Zoro draws his swords." in trimmed
+    assert count_tokens(trimmed) <= 20
+
+
+def test_unpunctuated_text_is_truncated_not_emptied():
+    text = " ".join(["word"] * 500)  # no sentence breaks at all
+    trimmed = trim_to_tokens(text, 50)
+    assert trimmed
+    assert text.startswith(trimmed)
+    assert count_tokens(trimmed) <= 50
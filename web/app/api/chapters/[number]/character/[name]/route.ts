@@ -1,19 +1,25 @@
 import { NextResponse } from 'next/server';
 import { getCharacterChapterEvents } from '@/lib/database';
+import { databaseETag, jsonWithETag, notModified } from '@/lib/http-cache';
 
 export async function GET(
   request: Request,
   { params }: { params: { number: string; name: string } }
 ) {
   try {
+    const etag = databaseETag(request);
+    const cached = notModified(request, etag);
+    if (cached) {
+      return cached;
+    }
+    
     const chapterNumber = parseInt(params.number);
     const characterName = decodeURIComponent(params.name);
-    const events = getCharacterChapterEvents(characterName, chapterNumber);
+    const events = await getCharacterChapterEvents(characterName, chapterNumber);
     
-    return NextResponse.json({ events });
+    return jsonWithETag({ events }, etag);
   } catch (error) {
     console.error('Error fetching character chapter events:', error);
     return NextResponse.json({ error: 'Failed to fetch events' }, { status: 500 });
   }
 }
-
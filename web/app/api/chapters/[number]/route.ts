@@ -1,25 +1,32 @@
 import { NextResponse } from 'next/server';
 import { getChapter, getChapterEvents, getCharactersInChapter } from '@/lib/database';
+import { databaseETag, jsonWithETag, notModified } from '@/lib/http-cache';
 
 export async function GET(
   request: Request,
   { params }: { params: { number: string } }
 ) {
   try {
+    const etag = databaseETag(request);
+    const cached = notModified(request, etag);
+    if (cached) {
+      return cached;
+    }
+    
     const chapterNumber = parseInt(params.number);
-    const chapter = getChapter(chapterNumber);
+    const [chapter, events, characters] = await Promise.all([
+      getChapter(chapterNumber),
+      getChapterEvents(chapterNumber),
+      getCharactersInChapter(chapterNumber),
+    ]);
     
     if (!chapter) {
       return NextResponse.json({ error: 'Chapter not found' }, { status: 404 });
     }
     
-    const events = getChapterEvents(chapterNumber);
-    const characters = getCharactersInChapter(chapterNumber);
-    
-    return NextResponse.json({ chapter, events, characters });
+    return jsonWithETag({ chapter, events, characters }, etag);
   } catch (error) {
     console.error('Error fetching chapter:', error);
     return NextResponse.json({ error: 'Failed to fetch chapter' }, { status: 500 });
   }
 }
-
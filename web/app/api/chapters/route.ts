@@ -1,13 +1,19 @@
 import { NextResponse } from 'next/server';
 import { getAllChapters } from '@/lib/database';
+import { databaseETag, jsonWithETag, notModified } from '@/lib/http-cache';
 
-export async function GET() {
+export async function GET(request: Request) {
   try {
-    const chapters = getAllChapters();
-    return NextResponse.json(chapters);
+    const etag = databaseETag(request);
+    const cached = notModified(request, etag);
+    if (cached) {
+      return cached;
+    }
+    
+    const chapters = await getAllChapters();
+    return jsonWithETag(chapters, etag);
   } catch (error) {
     console.error('Error fetching chapters:', error);
     return NextResponse.json({ error: 'Failed to fetch chapters' }, { status: 500 });
   }
 }
-
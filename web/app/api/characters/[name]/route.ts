@@ -1,24 +1,28 @@
 import { NextResponse } from 'next/server';
-import { getCharacter, getCharacterHistory } from '@/lib/database';
+import { getCharacterWithHistory } from '@/lib/database';
+import { databaseETag, jsonWithETag, notModified } from '@/lib/http-cache';
 
 export async function GET(
   request: Request,
   { params }: { params: { name: string } }
 ) {
   try {
+    const etag = databaseETag(request);
+    const cached = notModified(request, etag);
+    if (cached) {
+      return cached;
+    }
+    
     const characterName = decodeURIComponent(params.name);
-    const character = getCharacter(characterName);
+    const { character, history } = await getCharacterWithHistory(characterName);
     
     if (!character) {
       return NextResponse.json({ error: 'Character not found' }, { status: 404 });
     }
     
-    const history = getCharacterHistory(characterName);
-    
-    return NextResponse.json({ character, history });
+    return jsonWithETag({ character, history }, etag);
   } catch (error) {
     console.error('Error fetching character:', error);
     return NextResponse.json({ error: 'Failed to fetch character' }, { status: 500 });
   }
 }
-
@@ -1,13 +1,55 @@
 import { NextResponse } from 'next/server';
-import { getAllCharacters } from '@/lib/database';
+import { getAllCharacters, getCharactersPage, searchCharacters, CharacterCursor } from '@/lib/database';
+import { databaseETag, jsonWithETag, notModified } from '@/lib/http-cache';
 
-export async function GET() {
+const DEFAULT_PAGE_SIZE = 100;
+const MAX_PAGE_SIZE = 500;
+
+// Cursors are "<stock>,<character_id>"; the stock never contains a comma
+function parseCursor(value: string | null): CharacterCursor | undefined {
+  if (!value) {
+    return undefined;
+  }
+  const separator = value.indexOf(',');
+  const stock = parseFloat(value.slice(0, separator));
+  if (separator === -1 || isNaN(stock)) {
+    return undefined;
+  }
+  return { stock, characterId: value.slice(separator + 1) };
+}
+
+export async function GET(request: Request) {
   try {
-    const characters = getAllCharacters();
-    return NextResponse.json(characters);
+    const etag = databaseETag(request);
+    const cached = notModified(request, etag);
+    if (cached) {
+      return cached;
+    }
+    
+    const { searchParams } = new URL(request.url);
+    
+    const search = searchParams.get('search')?.trim();
+    if (search) {
+      const characters = await searchCharacters(search);
+      return jsonWithETag(characters, etag);
+    }
+    
+    // Without paging parameters the full list is returned as before
+    if (!searchParams.has('limit') && !searchParams.has('after')) {
+      const characters = await getAllCharacters();
+      return jsonWithETag(characters, etag);
+    }
+    
+    const requested = parseInt(searchParams.get('limit') ?? '') || DEFAULT_PAGE_SIZE;
+    const limit = Math.min(Math.max(requested, 1), MAX_PAGE_SIZE);
+    const { characters, next } = await getCharactersPage(limit, parseCursor(searchParams.get('after')));
+    
+    return jsonWithETag({
+      characters,
+      next: next ? `${next.stock},${next.characterId}` : null,
+    }, etag);
   } catch (error) {
     console.error('Error fetching characters:', error);
     return NextResponse.json({ error: 'Failed to fetch characters' }, { status: 500 });
   }
 }
-
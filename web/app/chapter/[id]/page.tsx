@@ -1,6 +1,6 @@
 import { notFound } from 'next/navigation';
 import Link from 'next/link';
-import { getChapter, getChapterEvents, getCharactersInChapter, getCharacterChapterEvents, getCharacterChapterReasoning } from '@/lib/database';
+import { getChapterDetail } from '@/lib/database';
 import ChapterChart from '@/components/charts/ChapterChart';
 
 export const dynamic = 'force-dynamic';
@@ -13,36 +13,26 @@ export default async function ChapterPage({
   searchParams: { character?: string };
 }) {
   const chapterNumber = parseInt(params.id);
-  const chapter = await getChapter(chapterNumber);
+  const requestedCharacter = searchParams.character ? decodeURIComponent(searchParams.character) : undefined;
+  
+  // Chapter, its characters and the selected character's events/reasoning
+  // are fetched together in a single round trip
+  const { chapter, characters, events, chapterReasoning } = await getChapterDetail(chapterNumber, requestedCharacter);
   
   if (!chapter) {
     notFound();
   }
   
-  const characters = await getCharactersInChapter(chapterNumber);
-  const selectedCharacter = searchParams.character ? decodeURIComponent(searchParams.character) : characters[0]?.character_id;
-  
-  // Get events for selected character
-  const events = selectedCharacter 
-    ? await getCharacterChapterEvents(selectedCharacter, chapterNumber)
-    : [];
-  
-  // Get chapter-level reasoning for selected character
-  const chapterReasoning = selectedCharacter
-    ? await getCharacterChapterReasoning(selectedCharacter, chapterNumber)
-    : null;
+  const selectedCharacter = requestedCharacter ?? characters[0]?.character_id;
   
   const character = characters.find(c => c.character_id === selectedCharacter);
   
-  // Calculate total change from events
-  const totalChange = events.length > 0 
-    ? events.reduce((sum, e) => sum + e.stock_change, 0)
-    : 0;
+  // Total and running changes come precomputed from SQL window functions
+  const totalChange = events[0]?.total_change ?? 0;
   const startingStock = character?.current_stock ? character.current_stock - totalChange : 0;
   const percentChange = startingStock > 0 ? (totalChange / startingStock) * 100 : 0;
   
-  // Transform events for chart - calculate cumulative stock values
-  let cumulativeStock = startingStock;
+  // Transform events for chart - cumulative stock values
   const chartData = [
     // Add starting point
     {
@@ -53,8 +43,8 @@ export default async function ChapterPage({
     },
     // Then add all events
     ...events.map((event, index) => {
-      const prevStock = cumulativeStock;
-      cumulativeStock += event.stock_change;
+      const cumulativeStock = startingStock + event.running_change;
+      const prevStock = cumulativeStock - event.stock_change;
       const mult = prevStock > 0 ? (cumulativeStock / prevStock) : 1;
       return {
         action: index + 1,
@@ -1,21 +1,11 @@
 import Link from 'next/link';
-import { getAllChapters, getCharactersInChapter } from '@/lib/database';
+import { getChaptersWithCharacterCounts } from '@/lib/database';
 
 export const dynamic = 'force-dynamic';
 
 export default async function ChaptersPage() {
-  const chapters = await getAllChapters();
-  
-  // Fetch character counts for all chapters
-  const chaptersWithCounts = await Promise.all(
-    chapters.map(async (chapter) => {
-      const charactersInChapter = await getCharactersInChapter(chapter.chapter_id);
-      return {
-        ...chapter,
-        characterCount: charactersInChapter.length
-      };
-    })
-  );
+  // Character counts come back with the chapters in a single query
+  const chapters = await getChaptersWithCharacterCounts();
   
   return (
     <div className="space-y-8">
@@ -29,7 +19,7 @@ export default async function ChaptersPage() {
       </div>
       
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-4">
-        {chaptersWithCounts.map((chapter) => (
+        {chapters.map((chapter) => (
           <Link
             key={chapter.chapter_id}
             href={`/chapter/${chapter.chapter_id}`}
@@ -46,7 +36,7 @@ export default async function ChaptersPage() {
             </h3>
             
               <div className="flex items-center justify-between pt-3 border-t border-surface-border text-xs text-text-tertiary">
-                <span>{chapter.characterCount} characters</span>
+                <span>{chapter.character_count} characters</span>
                 {chapter.processed_timestamp && (
                   <span>
                     {new Date(chapter.processed_timestamp).toLocaleDateString()}
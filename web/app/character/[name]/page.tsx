@@ -1,20 +1,18 @@
 import { notFound } from 'next/navigation';
 import Link from 'next/link';
-import { getCharacter, getCharacterHistory } from '@/lib/database';
+import { getCharacterWithHistory } from '@/lib/database';
 import CharacterChart from '@/components/charts/CharacterChart';
 
 export const dynamic = 'force-dynamic';
 
 export default async function CharacterPage({ params }: { params: { name: string } }) {
   const characterId = decodeURIComponent(params.name);
-  const character = await getCharacter(characterId);
+  const { character, history, stats } = await getCharacterWithHistory(characterId);
   
   if (!character) {
     notFound();
   }
   
-  const history = await getCharacterHistory(characterId);
-  
   // Transform history for chart
   const chartData = history.map(h => ({
     chapter: h.chapter_id,
@@ -27,8 +25,8 @@ export default async function CharacterPage({ params }: { params: { name: string
   const currentStock = character.current_stock || character.initial_stock_value;
   const totalChange = currentStock - character.initial_stock_value;
   const percentChange = (totalChange / character.initial_stock_value) * 100;
-  const highestStock = history.length > 0 ? Math.max(...history.map(h => h.cumulative_stock_value)) : currentStock;
-  const lowestStock = history.length > 0 ? Math.min(...history.map(h => h.cumulative_stock_value)) : character.initial_stock_value;
+  const highestStock = stats.highest_stock ?? currentStock;
+  const lowestStock = stats.lowest_stock ?? character.initial_stock_value;
   
   return (
     <div className="space-y-8">
@@ -4,8 +4,10 @@ import { getTopCharacters, getAllChapters } from '@/lib/database';
 export const dynamic = 'force-dynamic';
 
 export default async function Home() {
-  const topCharacters = await getTopCharacters(10);
-  const chapters = await getAllChapters();
+  const [topCharacters, chapters] = await Promise.all([
+    getTopCharacters(10),
+    getAllChapters(),
+  ]);
   const latestChapter = chapters[chapters.length - 1];
 
   return (
@@ -1,4 +1,4 @@
-import { queryDatabase } from './python-bridge';
+import { queryDatabase, queryDatabaseBatch, Query } from './python-bridge';
 
 export interface Character {
   character_id: string;
@@ -20,6 +20,16 @@ export interface Chapter {
   processed_timestamp?: string;
 }
 
+export interface ChapterWithCount extends Chapter {
+  character_count: number;
+}
+
+export interface CharacterStockStats {
+  chapter_count: number;
+  highest_stock: number | null;
+  lowest_stock: number | null;
+}
+
 export interface MarketEvent {
   event_id: number;
   chapter_id: number;
@@ -30,6 +40,11 @@ export interface MarketEvent {
   description: string;
 }
 
+export interface CharacterChapterEvent extends MarketEvent {
+  running_change: number;
+  total_change: number;
+}
+
 export interface CharacterStockHistory {
   character_id: string;
   chapter_id: number;
@@ -39,29 +54,67 @@ export interface CharacterStockHistory {
   chapter_description?: string;
 }
 
-export async function getAllCharacters(): Promise<Character[]> {
-  // Get all characters with their latest stock values
-  const result = await queryDatabase(`
+// SQL text is fixed per statement and values are bound as parameters, so the
+// worker's connection can reuse its prepared statements across requests.
+// ?1 is the chapter number and ?2 the character id where both are used.
+
+// Characters with their latest stock values. The latest history row is
+// found with one grouped scan and joined, instead of running two correlated
+// subqueries for every character row.
+const CHARACTERS_WITH_STOCK = `
     SELECT 
       c.*,
-      COALESCE(
-        (SELECT cumulative_stock_value 
-         FROM character_stock_history csh 
-         WHERE csh.character_id = c.character_id 
-         ORDER BY chapter_id DESC LIMIT 1),
-        c.initial_stock_value
-      ) as current_stock,
-      (SELECT MAX(chapter_id) 
-       FROM character_stock_history csh 
-       WHERE csh.character_id = c.character_id) as last_chapter
+      COALESCE(csh.cumulative_stock_value, c.initial_stock_value) as current_stock,
+      latest.last_chapter
     FROM characters c
+    LEFT JOIN (
+      SELECT character_id, MAX(chapter_id) as last_chapter
+      FROM character_stock_history
+      GROUP BY character_id
+    ) latest ON latest.character_id = c.character_id
+    LEFT JOIN character_stock_history csh
+      ON csh.character_id = latest.character_id AND csh.chapter_id = latest.last_chapter
+`;
+
+const ALL_CHARACTERS_SQL = `
+    ${CHARACTERS_WITH_STOCK}
     ORDER BY current_stock DESC
-  `);
-  return result as Character[];
-}
+`;
 
-export async function getCharacter(characterId: string): Promise<Character | undefined> {
-  const result = await queryDatabase(`
+// Keyset pagination: each page continues strictly after the (stock, id) of
+// the previous page's last row, with the id as a tiebreaker so the order is
+// total and no rows are skipped or repeated between pages
+const CHARACTERS_PAGE_SQL = `
+    SELECT * FROM (${CHARACTERS_WITH_STOCK})
+    WHERE ?1 IS NULL OR (current_stock, character_id) < (?1, ?2)
+    ORDER BY current_stock DESC, character_id DESC
+    LIMIT ?3
+`;
+
+// Name search through the trigram FTS index (substring matches without a
+// full scan). Trigrams need at least three characters, so shorter terms and
+// databases without the index use LIKE instead.
+const SEARCH_CHARACTERS_SQL = `
+    ${CHARACTERS_WITH_STOCK}
+    WHERE c.rowid IN (
+      SELECT rowid FROM characters_fts WHERE characters_fts MATCH ?
+    )
+    ORDER BY current_stock DESC
+`;
+
+const SEARCH_CHARACTERS_LIKE_SQL = `
+    ${CHARACTERS_WITH_STOCK}
+    WHERE c.canonical_name LIKE '%' || ? || '%'
+    ORDER BY current_stock DESC
+`;
+
+const TOP_CHARACTERS_SQL = `
+    ${CHARACTERS_WITH_STOCK}
+    ORDER BY current_stock DESC
+    LIMIT ?
+`;
+
+const CHARACTER_SQL = `
     SELECT 
       c.*,
       COALESCE(
@@ -75,101 +128,244 @@ export async function getCharacter(characterId: string): Promise<Character | und
        FROM character_stock_history csh 
        WHERE csh.character_id = c.character_id) as last_chapter
     FROM characters c
-    WHERE c.character_id = '${characterId.replace(/'/g, "''")}'
-  `);
-  return result[0] as Character | undefined;
+    WHERE c.character_id = ?
+`;
+
+const CHARACTER_HISTORY_SQL = `
+    SELECT 
+      csh.*,
+      csh.chapter_reasoning as chapter_description
+    FROM character_stock_history csh
+    WHERE csh.character_id = ?
+    ORDER BY csh.chapter_id ASC
+`;
+
+const CHARACTER_STATS_SQL = `
+    SELECT 
+      COUNT(*) as chapter_count,
+      MAX(cumulative_stock_value) as highest_stock,
+      MIN(cumulative_stock_value) as lowest_stock
+    FROM character_stock_history
+    WHERE character_id = ?
+`;
+
+const ALL_CHAPTERS_SQL = 'SELECT * FROM chapters WHERE processed = 1 ORDER BY chapter_id ASC';
+
+// Processed chapters with the number of characters that had events in each,
+// counted in one grouped aggregate rather than one query per chapter
+const CHAPTERS_WITH_COUNTS_SQL = `
+    SELECT 
+      ch.*,
+      COALESCE(counts.character_count, 0) as character_count
+    FROM chapters ch
+    LEFT JOIN (
+      SELECT chapter_id, COUNT(DISTINCT character_id) as character_count
+      FROM market_events
+      GROUP BY chapter_id
+    ) counts ON counts.chapter_id = ch.chapter_id
+    WHERE ch.processed = 1
+    ORDER BY ch.chapter_id ASC
+`;
+
+const CHAPTER_SQL = 'SELECT * FROM chapters WHERE chapter_id = ?';
+
+const CHAPTER_EVENTS_SQL = `
+    SELECT * FROM market_events
+    WHERE chapter_id = ?
+    ORDER BY event_id ASC
+`;
+
+const CHARACTERS_IN_CHAPTER_SQL = `
+    SELECT 
+      c.*,
+      COALESCE(csh.cumulative_stock_value, c.initial_stock_value) as current_stock
+    FROM characters c
+    JOIN (
+      SELECT DISTINCT character_id
+      FROM market_events
+      WHERE chapter_id = ?1
+    ) me ON me.character_id = c.character_id
+    LEFT JOIN character_stock_history csh
+      ON csh.character_id = c.character_id AND csh.chapter_id = ?1
+    ORDER BY current_stock DESC
+`;
+
+// A NULL character id selects the top-ranked character of the chapter, so
+// the chapter page doesn't have to wait for the character list first
+const SELECTED_CHARACTER = `COALESCE(?2, (SELECT character_id FROM (${CHARACTERS_IN_CHAPTER_SQL}) LIMIT 1))`;
+
+// Running and total change are computed by window functions, so the page
+// doesn't need its own passes over the events to build the chart
+const CHARACTER_CHAPTER_EVENTS_SQL = `
+    SELECT 
+      *,
+      SUM(stock_change) OVER (ORDER BY event_id ROWS UNBOUNDED PRECEDING) as running_change,
+      SUM(stock_change) OVER () as total_change
+    FROM market_events
+    WHERE character_id = ${SELECTED_CHARACTER} AND chapter_id = ?1
+    ORDER BY event_id ASC
+`;
+
+const CHARACTER_CHAPTER_REASONING_SQL = `
+    SELECT chapter_reasoning
+    FROM character_stock_history
+    WHERE character_id = ${SELECTED_CHARACTER} AND chapter_id = ?1
+`;
+
+// Existence checks stop at the first row instead of counting the tables
+const HEALTH_SQL = `
+    SELECT 
+      EXISTS(SELECT 1 FROM characters) as has_characters,
+      EXISTS(SELECT 1 FROM chapters WHERE processed = 1) as has_chapters
+`;
+
+function query(sql: string, ...params: (string | number | null)[]): Query {
+  return { sql, params };
 }
 
-export async function getAllChapters(): Promise<Chapter[]> {
+export async function getAllCharacters(): Promise<Character[]> {
+  // Get all characters with their latest stock values
+  const result = await queryDatabase(query(ALL_CHARACTERS_SQL));
+  return result as Character[];
+}
+
+export interface CharacterCursor {
+  stock: number;
+  characterId: string;
+}
+
+export async function getCharactersPage(limit: number, after?: CharacterCursor): Promise<{
+  characters: Character[];
+  next: CharacterCursor | null;
+}> {
   const result = await queryDatabase(
-    'SELECT * FROM chapters WHERE processed = 1 ORDER BY chapter_id ASC'
+    query(CHARACTERS_PAGE_SQL, after?.stock ?? null, after?.characterId ?? null, limit)
   );
+  const characters = result as Character[];
+  const last = characters[characters.length - 1];
+  return {
+    characters,
+    next: characters.length === limit && last
+      ? { stock: last.current_stock as number, characterId: last.character_id }
+      : null,
+  };
+}
+
+export async function searchCharacters(search: string): Promise<Character[]> {
+  if (search.length >= 3) {
+    try {
+      // Quoted as an FTS5 string so the term is matched literally
+      const phrase = `"${search.replace(/"/g, '""')}"`;
+      const result = await queryDatabase(query(SEARCH_CHARACTERS_SQL, phrase));
+      return result as Character[];
+    } catch (error) {
+      console.error('Character search index unavailable, using LIKE:', error);
+    }
+  }
+  const result = await queryDatabase(query(SEARCH_CHARACTERS_LIKE_SQL, search));
+  return result as Character[];
+}
+
+export async function getCharacter(characterId: string): Promise<Character | undefined> {
+  const result = await queryDatabase(query(CHARACTER_SQL, characterId));
+  return result[0] as Character | undefined;
+}
+
+export async function getAllChapters(): Promise<Chapter[]> {
+  const result = await queryDatabase(query(ALL_CHAPTERS_SQL));
   return result as Chapter[];
 }
 
+export async function getChaptersWithCharacterCounts(): Promise<ChapterWithCount[]> {
+  const result = await queryDatabase(query(CHAPTERS_WITH_COUNTS_SQL));
+  return result as ChapterWithCount[];
+}
+
 export async function getChapter(chapterNumber: number): Promise<Chapter | undefined> {
-  const result = await queryDatabase(
-    `SELECT * FROM chapters WHERE chapter_id = ${chapterNumber}`
-  );
+  const result = await queryDatabase(query(CHAPTER_SQL, chapterNumber));
   return result[0] as Chapter | undefined;
 }
 
 export async function getChapterEvents(chapterNumber: number): Promise<MarketEvent[]> {
-  const result = await queryDatabase(`
-    SELECT * FROM market_events
-    WHERE chapter_id = ${chapterNumber}
-    ORDER BY event_id ASC
-  `);
+  const result = await queryDatabase(query(CHAPTER_EVENTS_SQL, chapterNumber));
   return result as MarketEvent[];
 }
 
 export async function getCharacterHistory(characterId: string): Promise<CharacterStockHistory[]> {
-  const result = await queryDatabase(`
-    SELECT 
-      csh.*,
-      csh.chapter_reasoning as chapter_description
-    FROM character_stock_history csh
-    WHERE csh.character_id = '${characterId.replace(/'/g, "''")}'
-    ORDER BY csh.chapter_id ASC
-  `);
+  const result = await queryDatabase(query(CHARACTER_HISTORY_SQL, characterId));
   return result as CharacterStockHistory[];
 }
 
-export async function getCharacterChapterEvents(characterId: string, chapterNumber: number): Promise<MarketEvent[]> {
-  const result = await queryDatabase(`
-    SELECT *
-    FROM market_events
-    WHERE character_id = '${characterId.replace(/'/g, "''")}' AND chapter_id = ${chapterNumber}
-    ORDER BY event_id ASC
-  `);
-  return result as MarketEvent[];
+// Character, full history and history stats in one round trip (shared
+// connection). The stats are aggregated by SQLite instead of extra passes
+// over the history rows.
+export async function getCharacterWithHistory(characterId: string): Promise<{
+  character: Character | undefined;
+  history: CharacterStockHistory[];
+  stats: CharacterStockStats;
+}> {
+  const [characterRows, history, statsRows] = await queryDatabaseBatch([
+    query(CHARACTER_SQL, characterId),
+    query(CHARACTER_HISTORY_SQL, characterId),
+    query(CHARACTER_STATS_SQL, characterId),
+  ]);
+  return {
+    character: characterRows[0] as Character | undefined,
+    history: history as CharacterStockHistory[],
+    stats: statsRows[0] as CharacterStockStats,
+  };
+}
+
+export async function getCharacterChapterEvents(characterId: string, chapterNumber: number): Promise<CharacterChapterEvent[]> {
+  const result = await queryDatabase(
+    query(CHARACTER_CHAPTER_EVENTS_SQL, chapterNumber, characterId)
+  );
+  return result as CharacterChapterEvent[];
 }
 
 export async function getCharacterChapterReasoning(characterId: string, chapterNumber: number): Promise<string | null> {
-  const result = await queryDatabase(`
-    SELECT chapter_reasoning
-    FROM character_stock_history
-    WHERE character_id = '${characterId.replace(/'/g, "''")}' AND chapter_id = ${chapterNumber}
-  `);
+  const result = await queryDatabase(
+    query(CHARACTER_CHAPTER_REASONING_SQL, chapterNumber, characterId)
+  );
   return result.length > 0 ? result[0].chapter_reasoning : null;
 }
 
 export async function getTopCharacters(limit: number = 10): Promise<Character[]> {
-  const result = await queryDatabase(`
-    SELECT 
-      c.*,
-      COALESCE(
-        (SELECT cumulative_stock_value 
-         FROM character_stock_history csh 
-         WHERE csh.character_id = c.character_id 
-         ORDER BY chapter_id DESC LIMIT 1),
-        c.initial_stock_value
-      ) as current_stock,
-      (SELECT MAX(chapter_id) 
-       FROM character_stock_history csh 
-       WHERE csh.character_id = c.character_id) as last_chapter
-    FROM characters c
-    ORDER BY current_stock DESC
-    LIMIT ${limit}
-  `);
+  const result = await queryDatabase(query(TOP_CHARACTERS_SQL, limit));
   return result as Character[];
 }
 
 export async function getCharactersInChapter(chapterNumber: number): Promise<Character[]> {
-  const result = await queryDatabase(`
-    SELECT DISTINCT 
-      c.*,
-      COALESCE(
-        (SELECT cumulative_stock_value 
-         FROM character_stock_history csh 
-         WHERE csh.character_id = c.character_id 
-         AND csh.chapter_id = ${chapterNumber}),
-        c.initial_stock_value
-      ) as current_stock
-    FROM characters c
-    JOIN market_events me ON c.character_id = me.character_id
-    WHERE me.chapter_id = ${chapterNumber}
-    ORDER BY current_stock DESC
-  `);
+  const result = await queryDatabase(query(CHARACTERS_IN_CHAPTER_SQL, chapterNumber));
   return result as Character[];
 }
+
+// Everything the chapter page needs in one round trip
+export async function getChapterDetail(chapterNumber: number, characterId?: string): Promise<{
+  chapter: Chapter | undefined;
+  characters: Character[];
+  events: CharacterChapterEvent[];
+  chapterReasoning: string | null;
+}> {
+  const selected = characterId ?? null;
+  const [chapterRows, characters, events, reasoningRows] = await queryDatabaseBatch([
+    query(CHAPTER_SQL, chapterNumber),
+    query(CHARACTERS_IN_CHAPTER_SQL, chapterNumber),
+    query(CHARACTER_CHAPTER_EVENTS_SQL, chapterNumber, selected),
+    query(CHARACTER_CHAPTER_REASONING_SQL, chapterNumber, selected),
+  ]);
+  return {
+    chapter: chapterRows[0] as Chapter | undefined,
+    characters: characters as Character[],
+    events: events as CharacterChapterEvent[],
+    chapterReasoning: reasoningRows.length > 0 ? reasoningRows[0].chapter_reasoning : null,
+  };
+}
+
+export async function getDatabaseHealth(): Promise<{ hasCharacters: boolean; hasChapters: boolean }> {
+  const [row] = await queryDatabase(query(HEALTH_SQL));
+  return {
+    hasCharacters: row.has_characters === 1,
+    hasChapters: row.has_chapters === 1,
+  };
+}
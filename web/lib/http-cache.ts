@@ -0,0 +1,30 @@
+import { NextResponse } from 'next/server';
+import { createHash } from 'crypto';
+import { databaseVersion } from './python-bridge';
+
+// API responses are fully determined by the database contents and the
+// request URL, so the ETag is a hash of the database version and the URL.
+export function databaseETag(request: Request): string {
+  const digest = createHash('blake2b512')
+    .update(`${databaseVersion()}|${request.url}`)
+    .digest('hex')
+    .slice(0, 24);
+  return `"${digest}"`;
+}
+
+// 304 response when the client already holds the current version
+export function notModified(request: Request, etag: string): NextResponse | null {
+  if (request.headers.get('If-None-Match') !== etag) {
+    return null;
+  }
+  return new NextResponse(null, { status: 304, headers: { ETag: etag } });
+}
+
+export function jsonWithETag(data: unknown, etag: string): NextResponse {
+  return NextResponse.json(data, {
+    headers: {
+      ETag: etag,
+      'Cache-Control': 'private, max-age=30',
+    },
+  });
+}
@@ -1,50 +1,223 @@
-import { spawn } from 'child_process';
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import fs from 'fs';
+import os from 'os';
 import path from 'path';
 
-export async function queryDatabase(query: string): Promise<any> {
-  return new Promise((resolve, reject) => {
-    const scriptPath = path.join(process.cwd(), '..', 'query_database.py');
-    const workingDir = path.join(process.cwd(), '..');
-    
-    const pythonProcess = spawn('python3', [scriptPath, query], {
-      cwd: workingDir,
-      maxBuffer: 10 * 1024 * 1024 // 10MB buffer
-    });
-    
-    let stdout = '';
-    let stderr = '';
-    
-    pythonProcess.stdout.on('data', (data) => {
-      stdout += data.toString();
-    });
-    
-    pythonProcess.stderr.on('data', (data) => {
-      stderr += data.toString();
-    });
+interface PendingRequest {
+  resolve: (results: any[]) => void;
+  reject: (error: Error) => void;
+}
+
+// A bare SQL string, or SQL with values bound to its ? placeholders
+export type Query = string | { sql: string; params?: (string | number | null)[] };
+
+interface CachedResult {
+  results: any[];
+  dbVersion: number;
+  expires: number;
+}
+
+interface QueryWorker {
+  process: ChildProcessWithoutNullStreams;
+  pending: Map<number, PendingRequest>;
+  nextId: number;
+}
+
+// Kept on globalThis so dev-mode hot reloads reuse the running workers
+// instead of spawning new ones each time this module is re-evaluated.
+const globalForWorker = globalThis as unknown as {
+  queryWorkers?: (QueryWorker | undefined)[];
+  queryCache?: Map<string, CachedResult>;
+};
+
+// Each worker answers its requests one at a time, so a small pool lets
+// concurrent page loads query SQLite in parallel (readers don't block each
+// other). Override the size with QUERY_WORKERS.
+const WORKER_COUNT = Math.max(
+  1,
+  parseInt(process.env.QUERY_WORKERS ?? '') || Math.min(4, os.cpus().length)
+);
+
+// The data only changes when the offline generator writes to the database,
+// so results are reused until the database file changes or the TTL expires.
+const CACHE_TTL_MS = 30_000;
+const CACHE_MAX_ENTRIES = 500;
+const DB_PATH = path.join(process.cwd(), '..', 'one_piece_stocks.db');
+
+export function databaseVersion(): number {
+  // Writes may sit in the WAL file until a checkpoint, so check both files
+  let version = 0;
+  for (const file of [DB_PATH, `${DB_PATH}-wal`]) {
+    try {
+      version = Math.max(version, fs.statSync(file).mtimeMs);
+    } catch {
+      // File doesn't exist (no WAL, or database not generated yet)
+    }
+  }
+  return version;
+}
+
+function getQueryCache(): Map<string, CachedResult> {
+  if (!globalForWorker.queryCache) {
+    globalForWorker.queryCache = new Map();
+  }
+  return globalForWorker.queryCache;
+}
+
+function startWorker(slot: number): QueryWorker {
+  const scriptPath = path.join(process.cwd(), '..', 'query_database.py');
+  const workingDir = path.join(process.cwd(), '..');
+  
+  // Long-lived worker: one read-only connection shared by every request
+  const pythonProcess = spawn('python3', [scriptPath, '--serve'], {
+    cwd: workingDir
+  });
+  
+  const worker: QueryWorker = {
+    process: pythonProcess,
+    pending: new Map(),
+    nextId: 0
+  };
+  
+  let buffer = '';
+  
+  pythonProcess.stdout.on('data', (data) => {
+    buffer += data.toString();
     
-    pythonProcess.on('close', (code) => {
-      if (code !== 0) {
-        console.error('Python stderr:', stderr);
-        reject(new Error(`Python process exited with code ${code}: ${stderr}`));
-        return;
-      }
+    let newline = buffer.indexOf('\n');
+    while (newline !== -1) {
+      const line = buffer.slice(0, newline);
+      buffer = buffer.slice(newline + 1);
+      newline = buffer.indexOf('\n');
       
+      let response: any;
       try {
-        const result = JSON.parse(stdout);
-        if (result.error) {
-          reject(new Error(result.error));
-        } else {
-          resolve(result);
-        }
+        response = JSON.parse(line);
       } catch (error) {
-        console.error('Failed to parse JSON:', stdout);
-        reject(error);
+        console.error('Failed to parse JSON:', line);
+        continue;
       }
-    });
-    
-    pythonProcess.on('error', (error) => {
-      reject(error);
-    });
+      
+      const request = worker.pending.get(response.id);
+      if (!request) {
+        continue;
+      }
+      worker.pending.delete(response.id);
+      
+      if (response.error) {
+        request.reject(new Error(response.error));
+      } else {
+        request.resolve(response.results);
+      }
+    }
+  });
+  
+  pythonProcess.stderr.on('data', (data) => {
+    console.error('Python stderr:', data.toString());
+  });
+  
+  const fail = (error: Error) => {
+    const workers = globalForWorker.queryWorkers;
+    if (workers && workers[slot] === worker) {
+      workers[slot] = undefined;
+    }
+    worker.pending.forEach((request) => request.reject(error));
+    worker.pending.clear();
+  };
+  
+  pythonProcess.on('exit', (code) => {
+    fail(new Error(`Python process exited with code ${code}`));
   });
+  
+  pythonProcess.on('error', (error) => {
+    fail(error);
+  });
+  
+  return worker;
 }
 
+// Least busy worker, starting workers lazily (and restarting dead ones)
+function pickWorker(): QueryWorker {
+  if (!globalForWorker.queryWorkers) {
+    globalForWorker.queryWorkers = [];
+  }
+  const workers = globalForWorker.queryWorkers;
+  
+  let best: QueryWorker | undefined;
+  for (let slot = 0; slot < WORKER_COUNT; slot++) {
+    const worker = workers[slot];
+    if (!worker) {
+      // An idle slot beats any busy worker
+      if (!best || best.pending.size > 0) {
+        workers[slot] = startWorker(slot);
+        return workers[slot] as QueryWorker;
+      }
+      continue;
+    }
+    if (!best || worker.pending.size < best.pending.size) {
+      best = worker;
+    }
+  }
+  return best as QueryWorker;
+}
+
+function sendQueries(queries: Query[]): Promise<any[]> {
+  const worker = pickWorker();
+  
+  return new Promise((resolve, reject) => {
+    const id = worker.nextId++;
+    worker.pending.set(id, { resolve, reject });
+    worker.process.stdin.write(JSON.stringify({ id, queries }) + '\n');
+  });
+}
+
+// Results are JSON arrays of flat row objects, so freezing the batch, each
+// result list and each row makes the whole structure immutable
+function freezeResults(results: any[]): any[] {
+  for (const rows of results) {
+    for (const row of rows) {
+      Object.freeze(row);
+    }
+    Object.freeze(rows);
+  }
+  return Object.freeze(results) as any[];
+}
+
+// Results are shared through the cache: every caller asking the same
+// queries gets the same arrays and row objects. They are frozen before
+// being cached, so treat them as read-only and copy (e.g. slice()) before
+// sorting, reversing or otherwise changing them.
+async function runQueries(queries: Query[]): Promise<any[]> {
+  const cache = getQueryCache();
+  const key = JSON.stringify(queries);
+  const dbVersion = databaseVersion();
+  const now = Date.now();
+  
+  const cached = cache.get(key);
+  if (cached && cached.dbVersion === dbVersion && cached.expires > now) {
+    return cached.results;
+  }
+  
+  const results = freezeResults(await sendQueries(queries));
+  
+  // Map keeps insertion order, so the first key is the oldest entry
+  cache.delete(key);
+  if (cache.size >= CACHE_MAX_ENTRIES) {
+    cache.delete(cache.keys().next().value as string);
+  }
+  cache.set(key, { results, dbVersion, expires: now + CACHE_TTL_MS });
+  
+  return results;
+}
+
+// The returned rows are shared and frozen (see runQueries)
+export async function queryDatabase(query: Query): Promise<any> {
+  const [result] = await runQueries([query]);
+  return result;
+}
+
+// Run several queries in a single request to the worker. Results are
+// returned in order, shared and frozen (see runQueries).
+export async function queryDatabaseBatch(queries: Query[]): Promise<any[]> {
+  return runQueries(queries);
+}
@@ -1,7 +1,10 @@
 /** @type {import('next').NextConfig} */
 const nextConfig = {
   reactStrictMode: true,
+  // gzip HTML and JSON API responses (the character list is highly
+  // repetitive); 304 responses from the API routes carry no body to compress
+  compress: true,
+  poweredByHeader: false,
 }
 
 module.exports = nextConfig
-
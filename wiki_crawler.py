@@ -2,29 +2,97 @@
 
 import requests
 from bs4 import BeautifulSoup
-from typing import Dict, List, Tuple, Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple, Optional
+import gzip
+import queue
+import threading
 import time
 import re
-from urllib.parse import urljoin, urlparse
+from urllib.parse import urlparse
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'  # several times faster than html.parser
+except ImportError:  # optional, fall back to the stdlib parser
+    HTML_PARSER = 'html.parser'
+
+# Links to wiki articles. Namespaced pages (File:, Category:, Template:,
+# Help:, Special:, ...) contain a colon, so they never match.
+ARTICLE_HREF = re.compile(r'^/wiki/[^:]+$')
+
+# Much stricter filtering for the summary fallback: links containing any of
+# these are places, groups, concepts or namespaces rather than characters
+SUMMARY_SKIP_PATTERNS = (
+    'Chapter', 'Episode', 'Arc', 'Saga', 'Volume',
+    'Devil_Fruit', 'Marine', 'Pirate', 'Grand_Line',
+    'East_Blue', 'New_World', 'Haki', 'Gomu_Gomu',
+    'Jolly_Roger', 'File:', 'Category:', 'Template:',
+    'Help:', 'Special:', 'Village', 'Bar', 'Island',
+    'Sea_King', 'Cover_Page', 'Color_Spread'
+)
+# All of them as one alternation, so each href is scanned once
+SUMMARY_SKIP_RE = re.compile('|'.join(map(re.escape, SUMMARY_SKIP_PATTERNS)))
+
+
+@lru_cache(maxsize=4096)
+def character_id_from_href(href: str) -> str:
+    """Character ID for a wiki href (memoized: recurring characters repeat)."""
+    # Remove /wiki/ prefix and any query parameters
+    path = urlparse(href).path
+    return path.replace('/wiki/', '')
 
 
 class WikiCrawler:
     """Crawls One Piece Wiki for chapter information."""
     
     BASE_URL = "https://onepiece.fandom.com"
+    CHAPTER_URL_TEMPLATE = BASE_URL + "/wiki/Chapter_%d"
     
-    def __init__(self, delay: float = 1.0):
+    def __init__(self, delay: float = 1.0, cache_dir: Optional[str] = None):
         """
         Initialize the crawler.
         
         Args:
             delay: Delay between requests in seconds (be respectful)
+            cache_dir: Directory for gzipped copies of fetched pages, reused
+                       on later runs instead of hitting the wiki (None disables)
         """
         self.delay = delay
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        # Keep-alive sessions are reused across requests. requests.Session
+        # isn't thread-safe, so each crawl thread gets its own copy of this one.
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'OnePieceStockTracker/1.0 (Educational Project)'
+            'User-Agent': 'OnePieceStockTracker/1.0 (Educational Project)',
+            'Accept-Encoding': 'gzip, deflate'
         })
+        self._local = threading.local()
+        self._local.session = self.session
+        self._sessions = [self.session]
+        self._sessions_lock = threading.Lock()
+        
+    def _get_session(self) -> requests.Session:
+        """Get the HTTP session for the current thread."""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.headers.update(self.session.headers)
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
+        
+    def close(self):
+        """Close the HTTP sessions."""
+        with self._sessions_lock:
+            for session in self._sessions:
+                session.close()
         
     def get_chapter_list_page(self, start_chapter: int = 1) -> str:
         """Get the chapter list page URL."""
@@ -41,17 +109,16 @@ class WikiCrawler:
         Returns:
             List of (chapter_number, url) tuples
         """
-        chapters = []
-        
         # One Piece has 1100+ chapters as of 2024
         # Generate URLs for chapters 1 through max_chapters (or a reasonable default)
         default_max = max_chapters if max_chapters else 1100
         
-        for chapter_num in range(1, default_max + 1):
-            url = f"{self.BASE_URL}/wiki/Chapter_{chapter_num}"
-            chapters.append((chapter_num, url))
-            
-        return chapters
+        return [(chapter_num, self.chapter_url(chapter_num))
+                for chapter_num in range(1, default_max + 1)]
+                
+    def chapter_url(self, chapter_num: int) -> str:
+        """Get the wiki URL of a chapter."""
+        return self.CHAPTER_URL_TEMPLATE % chapter_num
         
     def extract_character_id_from_href(self, href: str) -> str:
         """
@@ -59,10 +126,37 @@ class WikiCrawler:
         
         Example: /wiki/Monkey_D._Luffy -> Monkey_D._Luffy
         """
-        # Remove /wiki/ prefix and any query parameters
-        path = urlparse(href).path
-        character_id = path.replace('/wiki/', '')
-        return character_id
+        return character_id_from_href(href)
+        
+    def fetch_page(self, url: str, chapter_num: int) -> bytes:
+        """
+        Fetch a chapter page's HTML, from the page cache when enabled.
+        
+        Returns:
+            Raw page content
+        """
+        cache_path = None
+        if self.cache_dir:
+            cache_path = self.cache_dir / f"Chapter_{chapter_num}.html.gz"
+            try:
+                with gzip.open(cache_path, 'rb') as f:
+                    return f.read()
+            except (OSError, EOFError):
+                pass
+        
+        time.sleep(self.delay)  # Be respectful to the server
+        
+        response = self._get_session().get(url)
+        response.raise_for_status()
+        
+        if cache_path:
+            # Write then rename so an interrupted run never leaves a partial file
+            tmp_path = cache_path.with_suffix(f".{threading.get_ident()}.tmp")
+            with gzip.open(tmp_path, 'wb') as f:
+                f.write(response.content)
+            tmp_path.replace(cache_path)
+        
+        return response.content
         
     def fetch_chapter_data(self, chapter_url: str, chapter_num: int) -> Dict:
         """
@@ -77,12 +171,8 @@ class WikiCrawler:
                 - arc_name: str (if available)
                 - characters: List[Dict] with character_id, name, href
         """
-        time.sleep(self.delay)  # Be respectful to the server
-        
-        response = self.session.get(chapter_url)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
+        content = self.fetch_page(chapter_url, chapter_num)
+        soup = BeautifulSoup(content, HTML_PARSER)
         
         # Extract title
         title_elem = soup.find('h1', class_='page-header__title')
@@ -115,11 +205,16 @@ class WikiCrawler:
         content_div = soup.find('div', class_='mw-parser-output')
         
         description_parts = []
+        headings = []
         if content_div:
+            # Section headings with their text, extracted once for the
+            # passes below
+            headings = [(heading, heading.get_text(strip=True).lower())
+                        for heading in content_div.find_all(['h2', 'h3'])]
+            
             # Look for "Long Summary" heading first
             long_summary_found = False
-            for heading in content_div.find_all(['h2', 'h3']):
-                heading_text = heading.get_text(strip=True).lower()
+            for heading, heading_text in headings:
                 if 'long summary' in heading_text:
                     long_summary_found = True
                     # Get all paragraphs after "Long Summary" until next heading
@@ -134,8 +229,7 @@ class WikiCrawler:
             
             # If no "Long Summary" found, fall back to any "Summary" section
             if not long_summary_found:
-                for heading in content_div.find_all(['h2', 'h3']):
-                    heading_text = heading.get_text(strip=True).lower()
+                for heading, heading_text in headings:
                     if 'summary' in heading_text and 'short' not in heading_text:
                         # Get paragraphs after this heading
                         next_elem = heading.find_next_sibling()
@@ -179,27 +273,23 @@ class WikiCrawler:
             current = characters_section.find_next_sibling()
             while current and current.name not in ['h2', 'h3', 'h4']:
                 # Find all character links in this section
-                char_links = current.find_all('a', href=re.compile(r'^/wiki/[^:]+$'))
+                char_links = current.find_all('a', href=ARTICLE_HREF)
                 
                 for link in char_links:
                     href = link.get('href')
                     
-                    # Skip file/category/template links
-                    if any(skip in href for skip in ['File:', 'Category:', 'Template:', 'Help:', 'Special:']):
-                        continue
-                    
                     # Check if we've already seen this character
                     if href in character_hrefs_seen:
                         continue
                         
                     character_hrefs_seen.add(href)
                     
-                    character_id = self.extract_character_id_from_href(href)
+                    # Only derive the ID for names that pass the filter
                     character_name = link.get_text(strip=True)
                     
-                    if character_name and len(character_name) > 1:
+                    if len(character_name) > 1:
                         characters.append({
-                            'character_id': character_id,
+                            'character_id': self.extract_character_id_from_href(href),
                             'name': character_name,
                             'href': href
                         })
@@ -211,7 +301,7 @@ class WikiCrawler:
         if not characters and content_div:
             # Look for character links only in Short/Long Summary sections
             summary_found = False
-            for heading in content_div.find_all(['h2', 'h3']):
+            for heading, _ in headings:
                 heading_text = heading.get_text().lower()
                 if 'summary' in heading_text:
                     summary_found = True
@@ -219,22 +309,13 @@ class WikiCrawler:
                     current = heading.find_next_sibling()
                     while current and current.name not in ['h2', 'h3']:
                         if current.name == 'p':
-                            char_links = current.find_all('a', href=re.compile(r'^/wiki/[^:]+$'))
+                            char_links = current.find_all('a', href=ARTICLE_HREF)
                             
                             for link in char_links:
                                 href = link.get('href')
                                 
                                 # Much stricter filtering for fallback method
-                                skip_patterns = [
-                                    'Chapter', 'Episode', 'Arc', 'Saga', 'Volume',
-                                    'Devil_Fruit', 'Marine', 'Pirate', 'Grand_Line',
-                                    'East_Blue', 'New_World', 'Haki', 'Gomu_Gomu',
-                                    'Jolly_Roger', 'File:', 'Category:', 'Template:',
-                                    'Help:', 'Special:', 'Village', 'Bar', 'Island',
-                                    'Sea_King', 'Cover_Page', 'Color_Spread'
-                                ]
-                                
-                                if any(pattern in href for pattern in skip_patterns):
+                                if SUMMARY_SKIP_RE.search(href):
                                     continue
                                 
                                 # Skip if already seen
@@ -243,13 +324,12 @@ class WikiCrawler:
                                     
                                 character_hrefs_seen.add(href)
                                 
-                                character_id = self.extract_character_id_from_href(href)
                                 character_name = link.get_text(strip=True)
                                 
                                 # Additional filter: skip very short names (likely not characters)
-                                if character_name and len(character_name) > 2:
+                                if len(character_name) > 2:
                                     characters.append({
-                                        'character_id': character_id,
+                                        'character_id': self.extract_character_id_from_href(href),
                                         'name': character_name,
                                         'href': href
                                     })
@@ -268,11 +348,11 @@ class WikiCrawler:
             'characters': characters
         }
         
-    def crawl_chapters(self, start_chapter: int = 1, 
-                      end_chapter: Optional[int] = None,
-                      max_chapters: Optional[int] = None) -> List[Dict]:
+    def get_chapter_urls(self, start_chapter: int = 1,
+                         end_chapter: Optional[int] = None,
+                         max_chapters: Optional[int] = None) -> List[Tuple[int, str]]:
         """
-        Crawl multiple chapters.
+        Get the (chapter_number, url) pairs to crawl for a chapter range.
         
         Args:
             start_chapter: First chapter to crawl
@@ -280,7 +360,7 @@ class WikiCrawler:
             max_chapters: Maximum number of chapters to crawl
             
         Returns:
-            List of chapter data dicts
+            List of (chapter_number, url) tuples
         """
         print("Generating chapter URLs...")
         
@@ -305,7 +385,26 @@ class WikiCrawler:
         if max_chapters:
             chapter_urls = chapter_urls[:max_chapters]
         
-        print(f"Will process {len(chapter_urls)} chapters (Chapter {chapter_urls[0][0]} to Chapter {chapter_urls[-1][0]})")
+        if chapter_urls:
+            print(f"Will process {len(chapter_urls)} chapters (Chapter {chapter_urls[0][0]} to Chapter {chapter_urls[-1][0]})")
+        
+        return chapter_urls
+        
+    def crawl_chapters(self, start_chapter: int = 1, 
+                      end_chapter: Optional[int] = None,
+                      max_chapters: Optional[int] = None) -> List[Dict]:
+        """
+        Crawl multiple chapters.
+        
+        Args:
+            start_chapter: First chapter to crawl
+            end_chapter: Last chapter to crawl (inclusive)
+            max_chapters: Maximum number of chapters to crawl
+        
+        Returns:
+            List of chapter data dicts
+        """
+        chapter_urls = self.get_chapter_urls(start_chapter, end_chapter, max_chapters)
         
         chapters_data = []
         for i, (chapter_num, url) in enumerate(chapter_urls, 1):
@@ -319,10 +418,92 @@ class WikiCrawler:
                 
         return chapters_data
         
+    def iter_chapters(self, chapter_urls: List[Tuple[int, str]],
+                      prefetch: int = 3, workers: int = 1) -> Iterator[Dict]:
+        """
+        Crawl chapters in the background, yielding them in order.
+        
+        Crawling runs up to `prefetch` chapters ahead of the consumer, so it
+        overlaps with processing instead of all happening up front. By default
+        pages are fetched one at a time; with more workers several are
+        fetched at once (each worker still waits `delay` before its request,
+        so the request rate grows with the worker count).
+        
+        Args:
+            chapter_urls: (chapter_number, url) tuples, e.g. from get_chapter_urls
+            prefetch: Maximum number of crawled chapters waiting to be consumed
+            workers: Number of chapters fetched concurrently
+        
+        Yields:
+            Chapter data dicts (chapters that fail to crawl are skipped)
+        """
+        ready = queue.Queue(maxsize=max(1, prefetch))
+        stop = threading.Event()
+        done = object()
+        
+        def put(item) -> bool:
+            # Block while the queue is full, but give up once the consumer stops
+            while not stop.is_set():
+                try:
+                    ready.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+            
+        def fetch(i, chapter_num, url):
+            print(f"Crawling chapter {chapter_num} ({i}/{len(chapter_urls)})...")
+            return self.fetch_chapter_data(url, chapter_num)
+            
+        def crawl():
+            todo = iter(enumerate(chapter_urls, 1))
+            in_flight = deque()
+            with ThreadPoolExecutor(max_workers=max(1, workers),
+                                    thread_name_prefix="chapter-crawl") as pool:
+                while not stop.is_set():
+                    # Keep every worker busy, but hand chapters over in order
+                    while len(in_flight) < max(1, workers):
+                        item = next(todo, None)
+                        if item is None:
+                            break
+                        i, (chapter_num, url) = item
+                        in_flight.append((chapter_num, pool.submit(fetch, i, chapter_num, url)))
+                    if not in_flight:
+                        put(done)
+                        return
+                    
+                    chapter_num, future = in_flight.popleft()
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        print(f"Error crawling chapter {chapter_num}: {e}")
+                        continue
+                    if not put(data):
+                        break
+                
+                # Consumer stopped early: drop chapters not started yet
+                for _, future in in_flight:
+                    future.cancel()
+        
+        worker = threading.Thread(target=crawl, name="chapter-prefetch", daemon=True)
+        worker.start()
+        
+        try:
+            while True:
+                item = ready.get()
+                if item is done:
+                    return
+                yield item
+        finally:
+            stop.set()
+            
+    def fetch_chapter(self, chapter_num: int) -> Dict:
+        """Fetch data for a single chapter by number."""
+        return self.fetch_chapter_data(self.chapter_url(chapter_num), chapter_num)
+        
     def test_single_chapter(self, chapter_num: int) -> Dict:
         """Test crawling a single chapter."""
-        url = f"{self.BASE_URL}/wiki/Chapter_{chapter_num}"
-        return self.fetch_chapter_data(url, chapter_num)
+        return self.fetch_chapter(chapter_num)
 
 
 if __name__ == "__main__":
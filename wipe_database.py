@@ -40,10 +40,17 @@ def wipe_database(db_path: str = "one_piece_stocks.db"):
     # Verify all tables are empty
     print("\n🔍 Verifying tables are empty...")
     all_empty = True
+    
+    # Count every wiped table in a single statement
+    wiped = [table for table in tables_to_wipe if table in tables]
+    counts = {}
+    if wiped:
+        cursor.execute("SELECT " + ", ".join(f"(SELECT COUNT(*) FROM {table})" for table in wiped))
+        counts = dict(zip(wiped, cursor.fetchone()))
+    
     for table in tables_to_wipe:
         if table in tables:
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            count = cursor.fetchone()[0]
+            count = counts[table]
             if count > 0:
                 print(f"❌ ERROR: {table} still has {count} rows!")
                 all_empty = False